@@ -1,19 +1,79 @@
 import csv
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.feature_extraction.text import CountVectorizer
 from wordcloud import WordCloud
 from numpy.polynomial.polynomial import Polynomial
 import nltk
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
 from nltk.corpus import stopwords
 from nltk.corpus import wordnet
 from nltk.stem import WordNetLemmatizer
 import string
 import re
 from collections import Counter
+from functools import lru_cache
+
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+}
+
+TECH_KEYWORDS = [
+    'python', 'java', 'javascript', 'sql', 'aws', 'docker', 'react', 'angular', 'node', 'linux', 'devops', 'tensorflow', 
+    'kubernetes', 'flutter', 'swift', 'cloud', 'ci/cd', 'cybersecurity', 'big data', 'data science', 'machine learning', 
+    'deep learning', 'hadoop', 'spark', 'tableau', 'power bi', 'pandas', 'pytorch', 'numpy', 'scikit-learn', 'keras', 
+    'figma', 'sketch', 'adobe xd', 'illustrator', 'photoshop', 'android', 'kotlin', 'seo', 'social media', 'marketing', 
+    'google ads', 'facebook ads', 'crm', 'content strategy', 'wordpress', 'html', 'css', 'sass'
+]
+
+ADDITIONAL_STOPWORDS = {'could', 'would', 'never', 'one', 'even', 'like', 'said', 'say', 'also',
+                        'might', 'must', 'every', 'much', 'may', 'two', 'know', 'upon', 'without',
+                        'go', 'went', 'got', 'put', 'see', 'seem', 'seemed', 'take', 'taken',
+                        'make', 'made', 'come', 'came', 'look', 'looking', 'think', 'thinking',
+                        'thought', 'use', 'used', 'find', 'found', 'give', 'given', 'tell', 'told',
+                        'ask', 'asked', 'back', 'get', 'getting', 'keep', 'kept', 'let', 'lets',
+                        'ensure', 'provide','seems', 'leave', 'left', 'set', 'from', 'subject', 're', 
+                        'edu', 'use'}
+
+LEMMATIZER = WordNetLemmatizer()
+
+# Columns the reports read, and those stored as categoricals, in compact mode.
+COMPACT_COLUMNS = ['title', 'location', 'company_industry', 'job_type', 'date_posted', 'is_remote', 'description']
+CATEGORICAL_COLUMNS = ['title', 'location', 'company_industry', 'job_type']
+
+
+def missing_nltk_data():
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+def ensure_nltk_data():
+    # Only hit the network when a corpus is actually missing, so restarts and
+    # forked workers do not each download it again.
+    for name in missing_nltk_data():
+        nltk.download(name)
+
+
+ensure_nltk_data()
+
+
+@lru_cache(maxsize=None)
+def custom_stopwords():
+    return frozenset(stopwords.words('english')).union(ADDITIONAL_STOPWORDS)
+
+
+def preload():
+    """Load the corpora into memory once, before the server forks its workers."""
+    custom_stopwords()
+    wordnet.ensure_loaded()
+    LEMMATIZER.lemmatize('jobs')
 
 def polynomial_regression(series, degree=3):
     x = series.dropna().index.values.astype(float)  # Convert index to float for regression
@@ -21,25 +81,60 @@ def polynomial_regression(series, degree=3):
     p = Polynomial.fit(x, y, degree)  # Fit polynomial regression
     return pd.Series(p(series.index.values.astype(float)), index=series.index)  # Predict using the polynomial model
 
+def top_counts(series, n=10):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Categorical value_counts lists absent categories too and breaks ties
+        # by category order; count from the codes, then order like the object
+        # path (first appearance) so both modes pick the same top n.
+        codes = series.cat.codes.to_numpy()
+        codes = codes[codes >= 0]
+        present, first_seen = np.unique(codes, return_index=True)
+        present = present[np.argsort(first_seen)]
+        counts = pd.Series(
+            np.bincount(codes)[present],
+            index=series.cat.categories[present].astype(object),
+            name='count',
+        )
+        return counts.sort_values(ascending=False).head(n)
+    return series.value_counts().head(n)
+
 class Analyzer:
-    def __init__(self, csv_dir):
+    def __init__(self, csv_dir, compact=False):
         self.csv_dir = csv_dir
-        self.jobs_data = pd.read_csv(self.csv_dir)
-        self.jobs_data_cleaned = self.jobs_data.dropna(subset=['description', 'date_posted'])
-        self.jobs_data_cleaned['date_posted'] = pd.to_datetime(self.jobs_data_cleaned['date_posted'], errors='coerce')
+        self.compact = compact
+        self.tech_keywords = TECH_KEYWORDS
+        if compact:
+            self.load_compact()
+        else:
+            self.jobs_data = pd.read_csv(self.csv_dir)
+            self.jobs_data_cleaned = self.jobs_data.dropna(subset=['description', 'date_posted'])
+            self.jobs_data_cleaned['date_posted'] = pd.to_datetime(self.jobs_data_cleaned['date_posted'], errors='coerce')
+            self.jobs_data_cleaned_2023 = self.jobs_data_cleaned[self.jobs_data_cleaned['date_posted'].dt.year >= 2023]
+            self.jobs_data_cleaned['is_remote'] = self.jobs_data_cleaned['is_remote'].astype(str).replace('nan', 'no')
         self.all_descriptions = ' '.join(self.jobs_data_cleaned['description'].dropna())
-        self.tech_keywords = [
-            'python', 'java', 'javascript', 'sql', 'aws', 'docker', 'react', 'angular', 'node', 'linux', 'devops', 'tensorflow', 
-            'kubernetes', 'flutter', 'swift', 'cloud', 'ci/cd', 'cybersecurity', 'big data', 'data science', 'machine learning', 
-            'deep learning', 'hadoop', 'spark', 'tableau', 'power bi', 'pandas', 'pytorch', 'numpy', 'scikit-learn', 'keras', 
-            'figma', 'sketch', 'adobe xd', 'illustrator', 'photoshop', 'android', 'kotlin', 'seo', 'social media', 'marketing', 
-            'google ads', 'facebook ads', 'crm', 'content strategy', 'wordpress', 'html', 'css', 'sass'
-        ]
-        self.jobs_data_cleaned_2023 = self.jobs_data_cleaned[self.jobs_data_cleaned['date_posted'].dt.year >= 2023]
-        self.jobs_data_cleaned['is_remote'] = self.jobs_data_cleaned['is_remote'].astype(str).replace('nan', 'no')
+        self.recent_mask = (self.jobs_data_cleaned['date_posted'].dt.year >= 2023).to_numpy()
+
+    def load_compact(self):
+        # Only the report columns, repeated strings as categoricals and
+        # is_remote as a nullable boolean; the cleaned frame is the only copy.
+        dtypes = {column: 'category' for column in CATEGORICAL_COLUMNS}
+        dtypes['is_remote'] = 'boolean'
+        jobs = pd.read_csv(self.csv_dir, usecols=lambda column: column in COMPACT_COLUMNS, dtype=dtypes)
+        jobs = jobs.dropna(subset=['description', 'date_posted'])
+        jobs['date_posted'] = pd.to_datetime(jobs['date_posted'], errors='coerce')
+        for column in CATEGORICAL_COLUMNS:
+            if column in jobs:
+                jobs[column] = jobs[column].cat.remove_unused_categories()
+        self.jobs_data = self.jobs_data_cleaned = jobs
+
+    def remote_mask(self, remote):
+        is_remote = self.jobs_data_cleaned['is_remote']
+        if is_remote.dtype == 'boolean':
+            return is_remote.eq(remote).fillna(False).to_numpy(dtype=bool)
+        return (is_remote == str(remote)).to_numpy()
 
     def top_job_titles(self, n=10):
-        return dict(self.jobs_data_cleaned['title'].value_counts().head(n))
+        return dict(top_counts(self.jobs_data_cleaned['title'], n))
 
     def wordcloud(self):
         text = str(self.all_descriptions).lower()
@@ -48,21 +143,10 @@ class Analyzer:
         words = text.split()
         words = [word for word in words if len(word) > 2]
 
-        additional_stopwords = {'could', 'would', 'never', 'one', 'even', 'like', 'said', 'say', 'also',
-                                'might', 'must', 'every', 'much', 'may', 'two', 'know', 'upon', 'without',
-                                'go', 'went', 'got', 'put', 'see', 'seem', 'seemed', 'take', 'taken',
-                                'make', 'made', 'come', 'came', 'look', 'looking', 'think', 'thinking',
-                                'thought', 'use', 'used', 'find', 'found', 'give', 'given', 'tell', 'told',
-                                'ask', 'asked', 'back', 'get', 'getting', 'keep', 'kept', 'let', 'lets',
-                                'ensure', 'provide','seems', 'leave', 'left', 'set', 'from', 'subject', 're', 
-                                'edu', 'use'}
-        
-        custom_stopwords = set(stopwords.words('english')).union(additional_stopwords)
-
-        filtered_words = [word for word in words if word not in custom_stopwords]
+        stop_words = custom_stopwords()
+        filtered_words = [word for word in words if word not in stop_words]
 
-        lemmatizer = WordNetLemmatizer()
-        lemmatized_words = [lemmatizer.lemmatize(word) for word in filtered_words]
+        lemmatized_words = [LEMMATIZER.lemmatize(word) for word in filtered_words]
         word_freq = Counter(lemmatized_words)
         sorted_word_freq = sorted(word_freq.items(), key=lambda item: item[1], reverse=True)
         temp_dict = dict()
@@ -77,7 +161,8 @@ class Analyzer:
         return dict(location_distribution_cleaned)
     
     def job_posting_trend(self):
-        job_posting_trends_2023 = self.jobs_data_cleaned_2023.groupby(self.jobs_data_cleaned_2023['date_posted'].dt.date).size()
+        dates_2023 = self.jobs_data_cleaned['date_posted'][self.recent_mask]
+        job_posting_trends_2023 = dates_2023.groupby(dates_2023.dt.date).size()
         job_posting_trends_2023 = job_posting_trends_2023.rolling(window=7).mean().dropna()
         job_posting_trend_dict = dict()
 
@@ -87,7 +172,7 @@ class Analyzer:
         return job_posting_trend_dict
     
     def top10_industries_with_most_jobs(self):
-        industry_distribution = self.jobs_data_cleaned['company_industry'].dropna().value_counts().head(10).sort_values(ascending=True)
+        industry_distribution = top_counts(self.jobs_data_cleaned['company_industry'].dropna()).sort_values(ascending=True)
         return dict(industry_distribution.sort_index(ascending=True))
     
     def most_mentioned_skills_and_techstacks(self):
@@ -95,23 +180,25 @@ class Analyzer:
         return tech_stack_frequency
     
     def top10_remote_jobs(self):
-        remote_jobs = self.jobs_data_cleaned[self.jobs_data_cleaned['is_remote'] == 'True']
-        top_10_remote_job_titles = remote_jobs['title'].value_counts().head(10)     
+        remote_titles = self.jobs_data_cleaned['title'][self.remote_mask(True)]
+        top_10_remote_job_titles = top_counts(remote_titles)
         top_10_remote_job_titles_sorted = top_10_remote_job_titles.sort_values(ascending=True)  # Sort in ascending order for horizontal barplot
         
         return dict(top_10_remote_job_titles_sorted)
     
     def top10_non_remote_jobs(self):
-        non_remote_jobs = self.jobs_data_cleaned[self.jobs_data_cleaned['is_remote'] == 'False']
-        top_10_non_remote_job_titles = non_remote_jobs['title'].value_counts().head(10)
+        non_remote_titles = self.jobs_data_cleaned['title'][self.remote_mask(False)]
+        top_10_non_remote_job_titles = top_counts(non_remote_titles)
         top_10_non_remote_job_titles_sorted = top_10_non_remote_job_titles.sort_values(ascending=True)  # Sort in ascending order for horizontal barplot
 
         return dict(top_10_non_remote_job_titles_sorted)
     
     def tech_stacks_overtime(self):
-        tech_trends_extended = pd.DataFrame(index=self.jobs_data_cleaned_2023['date_posted'].dt.date)
+        days_2023 = self.jobs_data_cleaned['date_posted'][self.recent_mask].dt.date
+        descriptions_2023 = self.jobs_data_cleaned['description'][self.recent_mask].str.lower()
+        tech_trends_extended = pd.DataFrame(index=days_2023)
         for keyword in self.tech_keywords:
-            tech_trends_extended[keyword] = self.jobs_data_cleaned_2023['description'].str.lower().str.contains(keyword).groupby(self.jobs_data_cleaned_2023['date_posted'].dt.date).sum()
+            tech_trends_extended[keyword] = descriptions_2023.str.contains(keyword, regex=False).groupby(days_2023).sum()
 
         tech_stack_frequencies = tech_trends_extended.sum().sort_values(ascending=False)
         top_7_tech_stacks = tech_stack_frequencies.head(7).index.tolist()
@@ -1,11 +1,103 @@
 import json
-import re
 
-import google.generativeai as genai
-import yaml
+from metrics import StreamedLlmCall, key_alias, record_llm_usage, track_llm_call
+from settings import config, generative_model, shared_key_rotator
 
-with open("./config.yaml", "r") as file:
-    config = yaml.safe_load(file)
+JUDGE_MODEL = "gemini-1.5-pro"
+
+JUDGE_SYSTEM_INSTRUCTION = (
+    "Cek apakah untuk data ini, jawaban user sudah sesuai dengan kunci jawaban di setiap soalnya. "
+    "Beri juga persentase kemiripan atau keterkaitan (nilai anda) jawaban user terhadap kunci jawabannya. "
+    "Apabila persentase di bawah 70% DAN jawabannya tidak sesuai menurut Anda (dengan logis tentu saja), "
+    "beri penjelasan atau jawaban yang seharusnya. Respon anda harus dalam bentuk JSON array:\n\n"
+    '[{"id": ..., "Soal": ..., "Nilai": ..., "Komentar":...},\n'
+    '{"id": ..., "Soal": ..., "Nilai": ..., "Komentar":...}, ...]'
+    "\n\nGunakan bahasa yang dapat meng-encourage user, terkadang beri semangat kepada user agar tetap bersemangat dalam "
+    "meningkatkan kemampuan dirinya. Anda tidak diperbolehkan menjawab hal diluar konteks ini, pastikan supaya jawaban "
+    "anda hanya dalam bentuk JSON array."
+)
+
+JUDGE_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "id": {"type": "integer"},
+            "Soal": {"type": "string"},
+            "Nilai": {"type": "number"},
+            "Komentar": {"type": "string"},
+        },
+        "required": ["id", "Soal", "Nilai", "Komentar"],
+    },
+}
+
+
+class JsonArrayStreamParser:
+    """Incrementally split a streamed top-level JSON array into element strings."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.element_start = None
+        self.started = False
+
+    def feed(self, text):
+        self.buffer += text
+        elements = []
+        buffer = self.buffer
+        i = self.pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif not self.started:
+                if char == "[":
+                    self.started = True
+            elif char == '"':
+                self.in_string = True
+                if self.depth == 0 and self.element_start is None:
+                    self.element_start = i
+            elif char in "{[":
+                if self.depth == 0 and self.element_start is None:
+                    self.element_start = i
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 0:
+                    # End of the top-level array.
+                    if self.element_start is not None:
+                        elements.append(buffer[self.element_start:i].strip())
+                        self.element_start = None
+                    self.started = False
+                else:
+                    self.depth -= 1
+                    if self.depth == 0:
+                        # Objects are complete as soon as they close; do not
+                        # wait for the following comma.
+                        elements.append(buffer[self.element_start:i + 1])
+                        self.element_start = None
+            elif char == "," and self.depth == 0:
+                if self.element_start is not None:
+                    elements.append(buffer[self.element_start:i].strip())
+                    self.element_start = None
+            elif self.depth == 0 and self.element_start is None and not char.isspace():
+                self.element_start = i
+            i += 1
+
+        # Drop consumed text so memory stays bounded by the current element.
+        keep_from = self.element_start if self.element_start is not None else i
+        self.buffer = buffer[keep_from:]
+        if self.element_start is not None:
+            self.element_start = 0
+        self.pos = i - keep_from
+        return elements
 
 
 class ArchetypeChatbot:
@@ -19,48 +111,49 @@ class ArchetypeChatbot:
             "response_mime_type": "text/plain",
         }
 
-        self.pointer = 0
+        self.stream_gen_config = {
+            **self.gen_config,
+            "response_mime_type": "application/json",
+            "response_schema": JUDGE_RESPONSE_SCHEMA,
+        }
+
+        self.key_rotator = shared_key_rotator(self.api_key)
 
+    # One chatbot serves every request, so the key alias is returned to the
+    # caller rather than stored on the instance where a concurrent request
+    # would overwrite it.
     def pick_random_key(self):
-        if self.api_key:
-            pair_api_key = self.api_key[self.pointer]
-            self.pointer = (self.pointer + 1) % len(self.api_key)  # Update pointer
+        pair_api_key = self.key_rotator.next()
+        if pair_api_key:
             api_key, email_name = pair_api_key
             print(f"Using API Key from -> {email_name}")
-            return api_key
+            return api_key, key_alias(email_name)
         else:
-            return "No more API keys available."
+            return "No more API keys available.", None
 
-    def process_text(self, input_text):
-        api_key = self.pick_random_key()
-        genai.configure(api_key=api_key)
-
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-pro",
-            generation_config=self.gen_config,
-            system_instruction=(
-                "Cek apakah untuk data ini, jawaban user sudah sesuai dengan kunci jawaban di setiap soalnya. "
-                "Beri juga persentase kemiripan atau keterkaitan (nilai anda) jawaban user terhadap kunci jawabannya. "
-                "Apabila persentase di bawah 70% DAN jawabannya tidak sesuai menurut Anda (dengan logis tentu saja), "
-                "beri penjelasan atau jawaban yang seharusnya. Respon anda harus dalam bentuk JSON array:\n\n"
-                '[{"id": ..., "Soal": ..., "Nilai": ..., "Komentar":...},\n'
-                '{"id": ..., "Soal": ..., "Nilai": ..., "Komentar":...}, ...]'
-                "\n\nGunakan bahasa yang dapat meng-encourage user, terkadang beri semangat kepada user agar tetap bersemangat dalam "
-                "meningkatkan kemampuan dirinya. Anda tidak diperbolehkan menjawab hal diluar konteks ini, pastikan supaya jawaban "
-                "anda hanya dalam bentuk JSON array."
-            ),
+    def build_model(self, generation_config):
+        api_key, alias = self.pick_random_key()
+        model = generative_model(
+            api_key,
+            model_name=JUDGE_MODEL,
+            generation_config=generation_config,
+            system_instruction=JUDGE_SYSTEM_INSTRUCTION,
         )
+        return model, alias
+
+    def process_text(self, input_text):
+        model, alias = self.build_model(self.gen_config)
 
         chat_session = model.start_chat(history=[])
 
-        response = chat_session.send_message(input_text)
+        with track_llm_call(JUDGE_MODEL, alias):
+            response = chat_session.send_message(input_text)
+        record_llm_usage(JUDGE_MODEL, alias, response)
 
         cleaned_response = (
             response.text.replace("```json", "").replace("```", "").strip()
         )
 
-        cleaned_response = re.sub(r'(?<!\\)"', r"\"", cleaned_response)
-
         print(f"Cleaned response: {cleaned_response}")
 
         try:
@@ -74,3 +167,37 @@ class ArchetypeChatbot:
         else:
             print(f"Unexpected response format: {response_json}")
             raise ValueError("Response format is not as expected.")
+
+    def stream_text(self, input_text):
+        """Yield ``(index, item)`` for each array element as soon as it is complete.
+
+        ``item`` is None when that element could not be parsed; the remaining
+        elements are still yielded. Callers that may stop early should close
+        the generator (``contextlib.closing``) so the call is recorded at once.
+        """
+        model, alias = self.build_model(self.stream_gen_config)
+
+        chat_session = model.start_chat(history=[])
+
+        parser = JsonArrayStreamParser()
+        index = 0
+        last_chunk = None
+        with StreamedLlmCall(JUDGE_MODEL, alias) as call:
+            with call.waiting():
+                chunks = iter(chat_session.send_message(input_text, stream=True))
+            while True:
+                with call.waiting():
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                last_chunk = chunk
+                for element in parser.feed(chunk.text):
+                    try:
+                        item = json.loads(element)
+                    except json.JSONDecodeError as e:
+                        print(f"Error decoding JSON element {index}: {e}")
+                        item = None
+                    yield index, item if isinstance(item, dict) else None
+                    index += 1
+        # Usage metadata arrives with the final chunk of a streamed response.
+        record_llm_usage(JUDGE_MODEL, alias, last_chunk)
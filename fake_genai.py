@@ -0,0 +1,224 @@
+"""Offline stand-in for the parts of ``google.generativeai`` this service uses.
+
+Call ``install()`` before importing ``main`` (or any module that imports
+``google.generativeai``) and every Gemini call is answered locally with
+configurable latency, error rate and canned responses.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+
+DEFAULT_CV_REVIEW = {
+    "skor_peluang_diterima": 72,
+    "skor_peluang_unggul_dari_kandidat_lain": 65,
+    "skor_penulisan_dan_bahasa_cv": 80,
+    "peningkatan_yang_dapat_dilakukan": "Tambahkan dampak kuantitatif pada setiap proyek.",
+    "hal_bagus_yang_dipertahankan": "Struktur CV sudah rapi dan mudah dibaca.",
+    "kesimpulan": "CV sudah cukup baik, tinggal menonjolkan pencapaian.",
+}
+
+
+class FakeGenAIError(Exception):
+    pass
+
+
+class FakeGenAIConfig:
+    def __init__(
+        self,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        stream_chunk_chars=64,
+        responses=None,
+        seed=None,
+    ):
+        # Seconds per call; streamed responses spread it over the chunks.
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stream_chunk_chars = stream_chunk_chars
+        # model_name -> str, or callable(content) -> str
+        self.responses = responses or {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=float(os.getenv("FAKE_GENAI_LATENCY", 0)),
+            jitter=float(os.getenv("FAKE_GENAI_JITTER", 0)),
+            error_rate=float(os.getenv("FAKE_GENAI_ERROR_RATE", 0)),
+        )
+
+    def sample_latency(self):
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def should_fail(self):
+        with self.lock:
+            self.calls += 1
+            if self.random.random() < self.error_rate:
+                self.errors += 1
+                return True
+            return False
+
+
+CONFIG = FakeGenAIConfig()
+
+
+def default_judge_response(content):
+    try:
+        questions = json.loads(content)["questions"]
+    except (TypeError, ValueError, KeyError):
+        questions = []
+    results = []
+    for i, question in enumerate(questions, start=1):
+        correct = question.get("user_answer", "").strip().lower() == question.get(
+            "correct_answer", ""
+        ).strip().lower()
+        results.append(
+            {
+                "id": i,
+                "Soal": question.get("question", ""),
+                "Nilai": 100 if correct else 40,
+                "Komentar": "Jawaban kamu sudah tepat!" if correct else "Coba pelajari lagi materinya ya.",
+            }
+        )
+    return json.dumps(results)
+
+
+def default_response(model_name, content):
+    if "pro" in model_name:
+        return default_judge_response(content)
+    return json.dumps(DEFAULT_CV_REVIEW)
+
+
+class UsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+def _count_tokens(text):
+    # Roughly what Gemini reports for mixed Indonesian/English text.
+    return max(1, len(text) // 4)
+
+
+class GenerateContentResponse:
+    def __init__(self, text, prompt, chunks=None, chunk_delay=0.0):
+        self._text = text
+        self._chunks = chunks
+        self._chunk_delay = chunk_delay
+        self.usage_metadata = UsageMetadata(_count_tokens(prompt), _count_tokens(text))
+
+    @property
+    def text(self):
+        return self._text
+
+    def __iter__(self):
+        chunks = self._chunks or [self._text]
+        for i, chunk in enumerate(chunks):
+            time.sleep(self._chunk_delay)
+            response = GenerateContentResponse(chunk, "")
+            # Like Gemini, only the final chunk carries usage for the whole call.
+            response.usage_metadata = self.usage_metadata if i == len(chunks) - 1 else None
+            yield response
+
+    def resolve(self):
+        pass
+
+
+class ChatSession:
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content, *, stream=False, **kwargs):
+        response = self.model.generate_content(content, stream=stream)
+        self.history.append({"role": "user", "parts": [content]})
+        self.history.append({"role": "model", "parts": [response.text]})
+        return response
+
+
+class GenerativeModel:
+    def __init__(
+        self,
+        model_name="gemini-1.5-flash",
+        safety_settings=None,
+        generation_config=None,
+        system_instruction=None,
+        **kwargs,
+    ):
+        self.model_name = model_name
+        self.safety_settings = safety_settings
+        self.generation_config = generation_config
+        self.system_instruction = system_instruction
+        self._client = None
+
+    def start_chat(self, history=None, **kwargs):
+        return ChatSession(self, history)
+
+    def _render(self, content):
+        canned = CONFIG.responses.get(self.model_name)
+        if canned is None:
+            return default_response(self.model_name, content)
+        if callable(canned):
+            return canned(content)
+        return canned
+
+    def generate_content(self, contents, *, stream=False, **kwargs):
+        content = contents if isinstance(contents, str) else str(contents)
+        latency = CONFIG.sample_latency()
+        if CONFIG.should_fail():
+            time.sleep(latency)
+            raise FakeGenAIError("429 Resource has been exhausted (fake)")
+
+        text = self._render(content)
+        if not stream:
+            time.sleep(latency)
+            return GenerateContentResponse(text, content)
+
+        size = max(1, CONFIG.stream_chunk_chars)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        return GenerateContentResponse(
+            text, content, chunks=chunks, chunk_delay=latency / len(chunks)
+        )
+
+
+_configured = {}
+
+
+def configure(api_key=None, **kwargs):
+    _configured["api_key"] = api_key
+
+
+# settings.generative_model binds each model to a per-key client taken from
+# ``client.get_default_generative_client``; the fake models ignore it.
+client = types.SimpleNamespace(
+    get_default_generative_client=lambda: types.SimpleNamespace(api_key=_configured.get("api_key"))
+)
+
+
+def install(config=None):
+    """Register this module as ``google.generativeai`` and return its config."""
+    global CONFIG
+    if config is not None:
+        CONFIG = config
+
+    module = sys.modules[__name__]
+    try:
+        import google
+    except ImportError:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    google.generativeai = module
+    sys.modules["google.generativeai"] = module
+    return CONFIG
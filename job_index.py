@@ -0,0 +1,194 @@
+"""Queryable index over a scraped job list.
+
+``analyze_task`` builds one index per ``job_lists_id`` from the scraped
+DataFrame and pickles it under ``JOB_INDEX_DIR``. Queries load it once into
+an in-memory LRU and then filter with vectorized column masks; description
+keywords are looked up in an inverted index instead of being scanned.
+"""
+import math
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+JOB_INDEX_DIR = os.getenv("JOB_INDEX_DIR", "./data/jobs")
+JOB_INDEX_CACHE_SIZE = int(os.getenv("JOB_INDEX_CACHE_SIZE", 32))
+INDEX_VERSION = 1
+
+DEFAULT_COLUMNS = ["id", "site", "job_url", "title", "company", "location", "job_type", "date_posted", "is_remote"]
+MAX_PAGE_SIZE = 100
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class JobQueryError(ValueError):
+    pass
+
+
+class JobListIndex:
+    def __init__(self, frame, postings):
+        self.frame = frame
+        self.postings = postings
+        self._title = frame["title"].fillna("").str.lower()
+        self._location = frame["location"].fillna("").str.lower()
+        self._job_type = frame["job_type"].fillna("").str.lower()
+
+    @classmethod
+    def build(cls, jobs):
+        frame = jobs.reset_index(drop=True).copy()
+        for column in ("title", "location", "job_type", "description"):
+            if column not in frame:
+                frame[column] = None
+        frame["date_posted"] = pd.to_datetime(frame.get("date_posted"), errors="coerce")
+        if "is_remote" in frame:
+            frame["is_remote"] = frame["is_remote"].astype("boolean")
+
+        positions = defaultdict(list)
+        for row, description in enumerate(frame["description"].fillna("")):
+            for token in set(tokenize(description)):
+                positions[token].append(row)
+        postings = {token: np.array(rows, dtype=np.uint32) for token, rows in positions.items()}
+        return cls(frame, postings)
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(
+                {"version": INDEX_VERSION, "frame": self.frame, "postings": self.postings},
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            data = pickle.load(file)
+        if data.get("version") != INDEX_VERSION:
+            raise JobQueryError("Indeks lowongan perlu dibangun ulang")
+        return cls(data["frame"], data["postings"])
+
+    def search_rows(self, keywords):
+        """Rows whose description contains every token of ``keywords``."""
+        rows = None
+        for token in set(tokenize(keywords)):
+            found = self.postings.get(token)
+            if found is None:
+                return np.array([], dtype=np.uint32)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+        return rows
+
+    def query(
+        self,
+        title=None,
+        location=None,
+        is_remote=None,
+        job_type=None,
+        date_from=None,
+        date_to=None,
+        q=None,
+        columns=None,
+        page=1,
+        page_size=20,
+    ):
+        if page < 1:
+            raise JobQueryError("page harus >= 1")
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise JobQueryError(f"page_size harus antara 1 dan {MAX_PAGE_SIZE}")
+
+        columns = columns or [c for c in DEFAULT_COLUMNS if c in self.frame]
+        unknown = [c for c in columns if c not in self.frame]
+        if unknown:
+            raise JobQueryError(f"Kolom tidak dikenal: {', '.join(unknown)}")
+
+        mask = np.ones(len(self.frame), dtype=bool)
+        if title:
+            mask &= self._title.str.contains(title.lower(), regex=False).to_numpy()
+        if location:
+            mask &= self._location.str.contains(location.lower(), regex=False).to_numpy()
+        if job_type:
+            # jobspy joins several types as "fulltime, contract".
+            pattern = rf"(?:^|,\s*){re.escape(job_type.lower())}(?:\s*,|$)"
+            mask &= self._job_type.str.contains(pattern).to_numpy()
+        if is_remote is not None and "is_remote" in self.frame:
+            mask &= (self.frame["is_remote"] == is_remote).fillna(False).to_numpy(dtype=bool)
+        if date_from is not None:
+            mask &= (self.frame["date_posted"] >= pd.Timestamp(date_from)).to_numpy()
+        if date_to is not None:
+            mask &= (self.frame["date_posted"] <= pd.Timestamp(date_to)).to_numpy()
+        if q:
+            rows = self.search_rows(q)
+            if rows is not None:
+                keyword_mask = np.zeros(len(self.frame), dtype=bool)
+                keyword_mask[rows] = True
+                mask &= keyword_mask
+
+        matches = np.flatnonzero(mask)
+        total = int(matches.size)
+        start = (page - 1) * page_size
+        selected = self.frame.iloc[matches[start:start + page_size]][columns]
+        return {
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "pages": math.ceil(total / page_size),
+            "items": to_records(selected),
+        }
+
+
+def to_records(frame):
+    frame = frame.copy()
+    if "date_posted" in frame:
+        frame["date_posted"] = frame["date_posted"].dt.strftime("%Y-%m-%d")
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).to_dict(orient="records")
+
+
+class JobIndexStore:
+    def __init__(self, directory=JOB_INDEX_DIR, maxsize=JOB_INDEX_CACHE_SIZE):
+        self.directory = directory
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path_for(self, job_lists_id):
+        return os.path.join(self.directory, f"{int(job_lists_id)}.pkl")
+
+    def _remember(self, job_lists_id, mtime, index):
+        with self._lock:
+            self._items[job_lists_id] = (mtime, index)
+            self._items.move_to_end(job_lists_id)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def build(self, job_lists_id, jobs):
+        os.makedirs(self.directory, exist_ok=True)
+        index = JobListIndex.build(jobs)
+        path = self.path_for(job_lists_id)
+        index.save(path)
+        self._remember(job_lists_id, os.stat(path).st_mtime_ns, index)
+        return index
+
+    def get(self, job_lists_id):
+        path = self.path_for(job_lists_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        # The mtime check picks up a list rebuilt by another worker process.
+        with self._lock:
+            cached = self._items.get(job_lists_id)
+            if cached is not None and cached[0] == mtime:
+                self._items.move_to_end(job_lists_id)
+                return cached[1]
+        index = JobListIndex.load(path)
+        self._remember(job_lists_id, mtime, index)
+        return index
@@ -2,15 +2,13 @@ from io import BytesIO
 import pandas as pd
 import google.generativeai as genai
 import PyPDF2
-import yaml
+
+from settings import config, shared_key_rotator
 
 
 def sanitize_text(text: str) -> str:
     return text.encode("utf-8", "surrogatepass").decode("utf-8", "ignore")
 
-with open("./config.yaml", "r") as file:
-    config = yaml.safe_load(file)
-
 class JobRecommender:
     def __init__(self, configs=config):
         self.api_key = configs["GEMINI_API_KEY_COLLECTION"]
@@ -33,13 +31,12 @@ class JobRecommender:
                 "threshold": "BLOCK_LOW_AND_ABOVE",
             },
         ]
-        self.pointer = 0
+        self.key_rotator = shared_key_rotator(self.api_key)
         self.used_cols = ['id', 'title', 'company', 'location', 'date_posted', 'job_type', 'description']
     
     def pick_random_key(self):
-        if self.api_key:
-            pair_api_key = self.api_key[self.pointer]
-            self.pointer = (self.pointer + 1) % len(self.api_key)  # Update pointer
+        pair_api_key = self.key_rotator.next()
+        if pair_api_key:
             api_key, email_name = pair_api_key
             print(f"Using API Key from -> {email_name}")
             return api_key
@@ -0,0 +1,425 @@
+"""Offline load test for the HTTP endpoints in ``main.py``.
+
+Gemini is replaced by ``fake_genai`` and jobspy by a stub that samples the
+bundled ``jobs.csv``, so no API keys or ``config.yaml`` are needed. The one
+exception is ``/generate_analysis``, whose word cloud needs the NLTK corpora;
+download them once (``python -m nltk.downloader punkt stopwords wordnet``)
+or leave that endpoint out. Background endpoints are timed end to end through
+a local webhook receiver.
+
+    python loadtest.py --concurrency 16 --requests 100 --genai-latency 1.5
+"""
+import argparse
+import asyncio
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+import fake_genai
+from webhook import LocalWebhookReceiver
+
+REPO_DIR = Path(__file__).parent
+CONNECTION_RETRIES = 2
+ENDPOINTS = ["generate_analysis", "analyze_cv", "upskill_judge", "upskill_judge_stream", "submit_audio"]
+
+FAKE_CONFIG = {
+    "GEMINI_API_KEY_COLLECTION": [
+        ["fake-key-1", "loadtest-1@example.com"],
+        ["fake-key-2", "loadtest-2@example.com"],
+    ],
+    "generation_config": {
+        "temperature": 1,
+        "top_p": 0.95,
+        "top_k": 64,
+        "max_output_tokens": 8192,
+        "response_mime_type": "application/json",
+    },
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    return float(np.percentile(values, q))
+
+
+def make_pdf(pages):
+    """Build a minimal, valid single-font PDF with one line of text per page."""
+    font_obj = 3 + 2 * len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>",
+    ]
+    for i, text in enumerate(pages):
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_obj} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode("latin-1")
+    return out
+
+
+def make_wav(seconds, sample_rate, channels=1, speech=False, seed=0):
+    import soundfile as sf
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    audio = 0.01 * rng.standard_normal(t.size)
+    if speech:
+        # Amplitude-modulated harmonics are enough to trip webrtcvad.
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t))
+        audio += 0.3 * envelope * sum(np.sin(2 * np.pi * f * t) / k for k, f in enumerate((150, 300, 450, 600), start=1))
+    if channels > 1:
+        audio = np.repeat(audio[:, None], channels, axis=1)
+    buffer = io.BytesIO()
+    sf.write(buffer, audio.astype(np.float32), sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+class WebhookCollector(LocalWebhookReceiver):
+    """Local webhook receiver that records when each event arrives."""
+
+    def __init__(self, fail_rate=0.0, latency=0.0):
+        super().__init__(fail_rate=fail_rate, latency=latency)
+        self.arrivals = {}
+
+    def record(self, payload):
+        data = payload.get("data", {})
+        key = (
+            payload.get("event"),
+            str(data.get("review_id", data.get("jobs_analysis_id"))),
+        )
+        with self.condition:
+            self.arrivals[key] = time.perf_counter()
+        super().record(payload)
+
+    def wait_for(self, keys, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not all(key in self.arrivals for key in keys):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return {key: self.arrivals[key] for key in keys if key in self.arrivals}
+
+
+def install_jobspy_stub(jobs_csv, scrape_latency):
+    import pandas as pd
+
+    jobs = pd.read_csv(jobs_csv)
+
+    def scrape_jobs(results_wanted=1000, **kwargs):
+        time.sleep(scrape_latency)
+        return jobs.sample(n=min(results_wanted, len(jobs)), replace=False).reset_index(drop=True)
+
+    module = types.ModuleType("jobspy")
+    module.scrape_jobs = scrape_jobs
+    sys.modules["jobspy"] = module
+
+
+def check_nltk_data(args):
+    # Without the corpora every analyze_task fails in the background and the
+    # run would only show pending webhooks, so stop before sending anything.
+    if "generate_analysis" not in args.endpoints:
+        return
+    import analyst
+
+    missing = analyst.missing_nltk_data()
+    if missing:
+        sys.exit(
+            f"generate_analysis needs the NLTK corpora {', '.join(missing)}, which could not be downloaded. "
+            f"Run `python -m nltk.downloader {' '.join(missing)}` once with internet access, "
+            "or leave generate_analysis out of --endpoints."
+        )
+
+
+def prepare_environment(args, webhook_url):
+    import yaml
+
+    workdir = Path(tempfile.mkdtemp(prefix="modul-ai-loadtest-"))
+    (workdir / "public").mkdir()
+    configs = dict(FAKE_CONFIG)
+    if args.no_prescore:
+        configs["quiz_prescoring"] = {"enabled": False}
+    with open(workdir / "config.yaml", "w") as file:
+        yaml.safe_dump(configs, file)
+
+    os.environ["WEBHOOK_URL"] = webhook_url
+    os.environ.setdefault("WEBHOOK_SECRET", "loadtest-secret")
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_DIR))
+    check_nltk_data(args)
+
+    fake_genai.install(
+        fake_genai.FakeGenAIConfig(
+            latency=args.genai_latency,
+            jitter=args.genai_jitter,
+            error_rate=args.genai_error_rate,
+            seed=args.seed,
+        )
+    )
+    install_jobspy_stub(args.jobs_csv, args.scrape_latency)
+    return workdir
+
+
+def start_server(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+class EndpointResult:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.completions = []
+        self.errors = 0
+        self.elapsed = 0.0
+        self.pending = 0
+        self.failures = Counter()
+
+    def row(self):
+        total = len(self.latencies) + self.errors
+        throughput = total / self.elapsed if self.elapsed else float("nan")
+        values = self.completions or self.latencies
+        return (
+            self.name,
+            total,
+            self.errors,
+            self.pending,
+            throughput,
+            percentile(values, 50) * 1000,
+            percentile(values, 90) * 1000,
+            percentile(values, 99) * 1000,
+            max(values, default=float("nan")) * 1000,
+        )
+
+
+def build_request(endpoint, i, args, fixtures):
+    if endpoint == "generate_analysis":
+        body = {
+            "text": "data engineer",
+            "jobs_analysis_id": i,
+            "job_lists_id": i,
+        }
+        return "/generate_analysis", {"json": body}, ("analysis_generated", str(i))
+    if endpoint == "analyze_cv":
+        pdf = fixtures["cv_pdf"] if args.same_cv else make_pdf([f"Curriculum Vitae kandidat {i}", "Python, SQL, Docker"])
+        review_id = f"loadtest-{i}"
+        files = {
+            "file": ("cv.pdf", pdf, "application/pdf"),
+            "job_analysis": ("job_analysis.json", fixtures["job_analysis"], "application/json"),
+        }
+        return "/analyze_cv", {"files": files, "data": {"review_id": review_id}}, ("cv_analyzed", review_id)
+    if endpoint == "upskill_judge":
+        return "/upskill-judge", {"json": fixtures["quiz"]}, None
+    if endpoint == "upskill_judge_stream":
+        return "/upskill-judge/stream", {"json": fixtures["quiz"]}, None
+    if endpoint == "submit_audio":
+        files = {"file": ("sample.wav", fixtures["wav"], "audio/wav")}
+        return "/submit_audio", {"files": files}, None
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def failure_kind(error):
+    import httpx
+
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"HTTP {error.response.status_code}"
+    return type(error).__name__
+
+
+async def run_endpoint(client, endpoint, args, fixtures, collector):
+    import httpx
+
+    result = EndpointResult(endpoint)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    sent_at = {}
+
+    async def post(path, kwargs):
+        # A keep-alive connection the server dropped after an error surfaces
+        # as a transport error on the next request; retry those on a fresh one.
+        for attempt in range(CONNECTION_RETRIES + 1):
+            try:
+                return await client.post(path, **kwargs)
+            except httpx.TransportError:
+                if attempt == CONNECTION_RETRIES:
+                    raise
+
+    async def one(i):
+        path, kwargs, webhook_key = build_request(endpoint, i, args, fixtures)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await post(path, kwargs)
+                response.raise_for_status()
+            except Exception as e:
+                result.errors += 1
+                result.failures[failure_kind(e)] += 1
+                if args.verbose:
+                    print(f"{endpoint} #{i} failed: {e!r}")
+                return
+            result.latencies.append(time.perf_counter() - start)
+            if webhook_key is not None:
+                sent_at[webhook_key] = start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    if sent_at:
+        arrivals = await asyncio.to_thread(
+            collector.wait_for, list(sent_at), args.completion_timeout
+        )
+        result.completions = [arrivals[key] - sent_at[key] for key in arrivals]
+        result.pending = len(sent_at) - len(arrivals)
+        if arrivals:
+            result.elapsed = max(arrivals.values()) - start
+    if not result.elapsed:
+        result.elapsed = time.perf_counter() - start
+    return result
+
+
+def print_report(results):
+    header = ("endpoint", "requests", "errors", "pending", "req/s", "p50 ms", "p90 ms", "p99 ms", "max ms")
+    print("{:<20}{:>10}{:>8}{:>9}{:>10}{:>11}{:>11}{:>11}{:>11}".format(*header))
+    for result in results:
+        print("{:<20}{:>10}{:>8}{:>9}{:>10.1f}{:>11.1f}{:>11.1f}{:>11.1f}{:>11.1f}".format(*result.row()))
+    print("Background endpoints report webhook completion latency; the rest report response latency.")
+    for result in results:
+        if result.failures:
+            kinds = ", ".join(f"{kind} x{count}" for kind, count in result.failures.most_common())
+            print(f"{result.name} failures: {kinds}")
+    if any(result.pending for result in results):
+        print("Pending requests never produced a webhook; check the server log above for background task errors.")
+
+
+async def drive(args, fixtures, base_url, collector):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = []
+    for endpoint in args.endpoints:
+        # A fresh client per endpoint, so connections broken by one endpoint's
+        # server errors are not reused for the next.
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+            results.append(await run_endpoint(client, endpoint, args, fixtures, collector))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", type=lambda s: s.split(","), default=ENDPOINTS,
+                        help=f"comma separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint")
+    parser.add_argument("--genai-latency", type=float, default=1.0, help="seconds per fake Gemini call")
+    parser.add_argument("--genai-jitter", type=float, default=0.2)
+    parser.add_argument("--genai-error-rate", type=float, default=0.0)
+    parser.add_argument("--scrape-latency", type=float, default=0.5, help="seconds per stubbed jobspy scrape")
+    parser.add_argument("--jobs-csv", default=str(REPO_DIR / "jobs.csv"))
+    parser.add_argument("--job-analysis", default=str(REPO_DIR / "job_analysis.json"))
+    parser.add_argument("--quiz-items", type=int, default=6)
+    parser.add_argument("--no-prescore", action="store_true",
+                        help="send every quiz answer to the judge model")
+    parser.add_argument("--audio-seconds", type=float, default=5.0)
+    parser.add_argument("--audio-rate", type=int, default=16000)
+    parser.add_argument("--same-cv", action="store_true", help="upload one identical CV every time")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--completion-timeout", type=float, default=300.0)
+    parser.add_argument("--webhook-fail-rate", type=float, default=0.0,
+                        help="fraction of webhook deliveries the receiver rejects with 503")
+    parser.add_argument("--webhook-latency", type=float, default=0.0, help="seconds the receiver takes per request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    for endpoint in args.endpoints:
+        if endpoint not in ENDPOINTS:
+            parser.error(f"unknown endpoint {endpoint!r}")
+    args.jobs_csv = str(Path(args.jobs_csv).resolve())
+    args.job_analysis = str(Path(args.job_analysis).resolve())
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with open(args.job_analysis, "rb") as file:
+        job_analysis = file.read()
+    fixtures = {
+        "job_analysis": job_analysis,
+        "cv_pdf": make_pdf(["Curriculum Vitae", "Python, SQL, Docker"]),
+        # Exact, "don't know" and paraphrased answers in turn: the first two
+        # are scored locally, the paraphrases still go to the judge model.
+        "quiz": [
+            {
+                "question": f"Soal nomor {i}?",
+                "answer": f"Jawaban {i}",
+                "userAnswer": [f"Jawaban {i}", "tidak tahu", f"Kalau tidak salah jawabannya {i}"][i % 3],
+            }
+            for i in range(args.quiz_items)
+        ],
+        "wav": make_wav(args.audio_seconds, args.audio_rate, seed=args.seed),
+    }
+
+    collector = WebhookCollector(fail_rate=args.webhook_fail_rate, latency=args.webhook_latency)
+    collector.start()
+    workdir = prepare_environment(args, collector.url)
+    print(f"Working directory: {workdir}")
+
+    import main as service
+
+    port = free_port()
+    server, thread = start_server(service.app, port)
+    try:
+        results = asyncio.run(drive(args, fixtures, f"http://127.0.0.1:{port}", collector))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        collector.stop()
+
+    print_report(results)
+    print(f"Fake Gemini calls: {fake_genai.CONFIG.calls} ({fake_genai.CONFIG.errors} injected errors)")
+    print(f"Webhook requests: {collector.requests}, outbox: {service.webhook_dispatcher.outbox.counts()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,20 @@
+import asyncio
 import csv
-import hashlib
-import hmac
 import json
 import os
+import time
 import uuid
+from contextlib import asynccontextmanager, closing
+from datetime import date
 from pathlib import Path
 from typing import Annotated, List
 
 import numpy as np
-import requests
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import BackgroundTasks, FastAPI, Form, UploadFile, File
+from fastapi import BackgroundTasks, FastAPI, Form, UploadFile, File, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from jobspy import scrape_jobs
 from pydantic import BaseModel
@@ -20,6 +22,14 @@ from pydantic import BaseModel
 from analyst import Analyzer
 from archetype_chatbot import ArchetypeChatbot
 from cv_analyst import GeminiCVAnalyst
+from job_index import JobIndexStore, JobQueryError
+from market_rollups import MarketQueryError, MarketRollups
+from metrics import background_task_queued, render_metrics, time_stage, track_background_task
+from pdf_extractor import MAX_PDF_BYTES
+from quiz_prescorer import QuizPrescorer, merge_results
+from result_cache import ResultCache, hash_cv_request
+from transcriber import SAMPLE_RATE, TranscriberUnavailable, get_transcriber, load_audio
+from webhook import WebhookDispatcher
 
 
 def convert_int64(o):
@@ -31,31 +41,24 @@ def convert_int64(o):
 load_dotenv()
 
 
-def send_webhook(event, data):
-    secret = os.getenv("WEBHOOK_SECRET", "very-long-secret")
-    url = os.getenv("WEBHOOK_URL", "http://localhost:8002/webhook")
-
-    payload = {"event": event, "data": data}
-
-    payload_string = json.dumps(payload)
-    payload_bytes = json.dumps(payload).encode("utf-8")
+webhook_dispatcher = WebhookDispatcher()
 
-    secret_bytes = bytes(secret, "utf-8")
-    signature = hmac.new(secret_bytes, payload_bytes, hashlib.sha256)
 
-    headers = {
-        "Content-Type": "application/json",
-        "Signature": signature.hexdigest(),
-    }
+def send_webhook(event, data):
+    # Persisted to the outbox and delivered by the dispatcher threads, so the
+    # caller never waits on the receiving server.
+    event_id = webhook_dispatcher.enqueue(event, data)
+    print(f"Queued webhook {event} as outbox event {event_id}")
 
-    print(
-        f"Sending webhook to {url} with payload {payload_string} and headers {headers}"
-    )
 
-    response = requests.post(url, data=payload_string, headers=headers)
+@asynccontextmanager
+async def lifespan(app):
+    webhook_dispatcher.start()
+    yield
+    webhook_dispatcher.stop()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -72,6 +75,17 @@ if not public_dir.exists():
 app.mount("/public", StaticFiles(directory=public_dir), name="public")
 
 
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+def run_background_task(task, func, *args):
+    with track_background_task(task):
+        func(*args)
+
+
 class TextSubmission(BaseModel):
     text: str
     jobs_analysis_id: int
@@ -79,47 +93,73 @@ class TextSubmission(BaseModel):
     mode: str = "default"
 
 
+# Output key -> Analyzer method, in the order the reports are written.
+ANALYSIS_REPORTS = [
+    ("top_job_titles", "top_job_titles"),
+    ("wordcloud_data", "wordcloud"),
+    ("top10_job_locs", "top10_job_locations"),
+    ("job_post_trend", "job_posting_trend"),
+    ("top10_industries_with_most_jobs", "top10_industries_with_most_jobs"),
+    ("most_mentioned_skills_and_techstacks", "most_mentioned_skills_and_techstacks"),
+    ("top10_remote_jobs", "top10_remote_jobs"),
+    ("top10_non_remote_jobs", "top10_non_remote_jobs"),
+    ("tech_stacks_overtime", "tech_stacks_overtime"),
+]
+
+
+job_index_store = JobIndexStore()
+market_rollups = MarketRollups()
+
+
 def analyze_task(submission: TextSubmission):
     print(f"Received submission: {submission.text}")
-    jobs = scrape_jobs(
-        site_name=["indeed", "linkedin", "zip_recruiter"],
-        search_term=submission.text,  # Mengakses `text` dari objek submission
-        location="indonesia",
-        results_wanted=1000,
-        hours_old=24 * 30 * 12,
-        country_indeed="indonesia",
-    )
+    with time_stage("analyze", "scrape"):
+        jobs = scrape_jobs(
+            site_name=["indeed", "linkedin", "zip_recruiter"],
+            search_term=submission.text,  # Mengakses `text` dari objek submission
+            location="indonesia",
+            results_wanted=1000,
+            hours_old=24 * 30 * 12,
+            country_indeed="indonesia",
+        )
 
     print(f"Found {len(jobs)} jobs")
 
     jobs_file_name = "public/" + str(uuid.uuid4()) + ".csv"
-    jobs.to_csv(
-        jobs_file_name, quoting=csv.QUOTE_NONNUMERIC, escapechar="\\", index=False
-    )
+    with time_stage("analyze", "csv_write"):
+        jobs.to_csv(
+            jobs_file_name, quoting=csv.QUOTE_NONNUMERIC, escapechar="\\", index=False
+        )
 
     print(f"Saved jobs to {jobs_file_name}")
 
-    analyst = Analyzer(csv_dir="./" + jobs_file_name)
+    with time_stage("analyze", "index"):
+        try:
+            job_index_store.build(submission.job_lists_id, jobs)
+        except Exception as e:
+            print(f"Failed to index job list {submission.job_lists_id}: {e}")
+
+    with time_stage("analyze", "rollup"):
+        try:
+            print(f"Added {market_rollups.add_postings(jobs)} new postings to market rollups")
+        except Exception as e:
+            print(f"Failed to update market rollups: {e}")
+
+    with time_stage("analyze", "load"):
+        analyst = Analyzer(csv_dir="./" + jobs_file_name, compact=True)
 
     print("Analysing data...")
 
-    analysis_res = {
-        "top_job_titles": analyst.top_job_titles(),
-        "wordcloud_data": analyst.wordcloud(),
-        "top10_job_locs": analyst.top10_job_locations(),
-        "job_post_trend": analyst.job_posting_trend(),
-        "top10_industries_with_most_jobs": analyst.top10_industries_with_most_jobs(),
-        "most_mentioned_skills_and_techstacks": analyst.most_mentioned_skills_and_techstacks(),
-        "top10_remote_jobs": analyst.top10_remote_jobs(),
-        "top10_non_remote_jobs": analyst.top10_non_remote_jobs(),
-        "tech_stacks_overtime": analyst.tech_stacks_overtime(),
-    }
+    analysis_res = {}
+    for key, report in ANALYSIS_REPORTS:
+        with time_stage("analyze", key):
+            analysis_res[key] = getattr(analyst, report)()
 
     print("Analysis done")
 
     json_res_name = "public/" + str(uuid.uuid4()) + ".json"
 
-    with open(json_res_name, "w") as json_file:
+    with time_stage("analyze", "json_dump"), open(json_res_name, "w") as json_file:
         json.dump(analysis_res, json_file, indent=4, default=convert_int64)
 
     print(f"Saved analysis to {json_res_name}")
@@ -131,19 +171,87 @@ def analyze_task(submission: TextSubmission):
         "job_lists_id": submission.job_lists_id,
     }
 
-    send_webhook("analysis_generated", response)
+    with time_stage("analyze", "webhook"):
+        send_webhook("analysis_generated", response)
 
 
 @app.post("/generate_analysis")
 async def analyze(submission: TextSubmission, background_tasks: BackgroundTasks):
-    background_tasks.add_task(analyze_task, submission)
+    background_task_queued("analyze")
+    background_tasks.add_task(run_background_task, "analyze", analyze_task, submission)
     return {"message": "Analysis started"}
 
 
-def analyze_cv_task(input_text, json_data, review_id: str):
-    cv_analyst = GeminiCVAnalyst()
-    result = cv_analyst.run_cv_analyst(input_text, json_data)
+@app.get("/jobs/{job_lists_id}")
+def list_jobs(
+    job_lists_id: int,
+    title: str = None,
+    location: str = None,
+    is_remote: bool = None,
+    job_type: str = None,
+    date_from: date = None,
+    date_to: date = None,
+    q: str = None,
+    columns: str = None,
+    page: int = 1,
+    page_size: int = 20,
+):
+    index = job_index_store.get(job_lists_id)
+    if index is None:
+        return JSONResponse(status_code=404, content={"message": "Daftar lowongan tidak ditemukan"})
+
+    try:
+        result = index.query(
+            title=title,
+            location=location,
+            is_remote=is_remote,
+            job_type=job_type,
+            date_from=date_from,
+            date_to=date_to,
+            q=q,
+            columns=[c.strip() for c in columns.split(",") if c.strip()] if columns else None,
+            page=page,
+            page_size=page_size,
+        )
+    except JobQueryError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+
+    return {"job_lists_id": job_lists_id, **result}
+
+
+@app.get("/market_trends")
+def market_trends(
+    dimension: str = "all",
+    values: str = None,
+    date_from: date = None,
+    date_to: date = None,
+    granularity: str = "day",
+    top: int = 10,
+):
+    try:
+        series = market_rollups.trends(
+            dimension=dimension,
+            values=[v.strip() for v in values.split(",") if v.strip()] if values else None,
+            date_from=date_from,
+            date_to=date_to,
+            granularity=granularity,
+            top=top,
+        )
+    except MarketQueryError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+
+    return {"dimension": dimension, "granularity": granularity, "series": series}
+
+
+cv_result_cache = ResultCache(
+    ttl_seconds=int(os.getenv("CV_RESULT_CACHE_TTL", 6 * 60 * 60)),
+    maxsize=int(os.getenv("CV_RESULT_CACHE_SIZE", 1024)),
+)
+# config.yaml is read once at startup, so the fingerprint is fixed per process.
+cv_prompt_fingerprint = GeminiCVAnalyst().prompt_fingerprint()
+
 
+def send_cv_result(result, review_id: str):
     response = {
         "result": result,
         "review_id": review_id,
@@ -152,6 +260,27 @@ def analyze_cv_task(input_text, json_data, review_id: str):
     send_webhook("cv_analyzed", response)
 
 
+def analyze_cv_task(input_text, json_data, review_id: str, cache_key: str):
+    result = None
+    try:
+        # A concurrent request for the same CV may have finished since the
+        # endpoint's cache check.
+        result = cv_result_cache.get(cache_key)
+        if result is None:
+            cv_analyst = GeminiCVAnalyst()
+            with time_stage("analyze_cv", "review"):
+                result = cv_analyst.run_cv_analyst(input_text, json_data)
+            if cv_analyst.last_run_ok:
+                cv_result_cache.set(cache_key, result)
+    finally:
+        waiting_review_ids = cv_result_cache.release(cache_key)
+
+    with time_stage("analyze_cv", "webhook"):
+        send_cv_result(result, review_id)
+        for waiting_review_id in waiting_review_ids:
+            send_cv_result(result, waiting_review_id)
+
+
 @app.post("/analyze_cv")
 async def analyze_cv(
     background_tasks: BackgroundTasks,
@@ -162,9 +291,29 @@ async def analyze_cv(
     print(
         f"Received CV file: {file.filename} and job analysis file: {job_analysis.filename} with review_id: {review_id}"
     )
-    input_text = await file.read()
+    input_text = await file.read(MAX_PDF_BYTES + 1)
     json_data = json.load(job_analysis.file)
-    background_tasks.add_task(analyze_cv_task, input_text, json_data, review_id)
+
+    cache_key = hash_cv_request(input_text, json_data, cv_prompt_fingerprint)
+    cached_result = cv_result_cache.get(cache_key)
+    if cached_result is not None:
+        print(f"Serving cached CV review for review_id: {review_id}")
+        background_tasks.add_task(send_cv_result, cached_result, review_id)
+        return {"message": "CV analysis started"}
+
+    if cv_result_cache.claim(cache_key, review_id):
+        background_task_queued("analyze_cv")
+        background_tasks.add_task(
+            run_background_task,
+            "analyze_cv",
+            analyze_cv_task,
+            input_text,
+            json_data,
+            review_id,
+            cache_key,
+        )
+    else:
+        print(f"CV review already in progress, queued review_id: {review_id}")
     return {"message": "CV analysis started"}
 
 
@@ -181,10 +330,10 @@ class QuizResult(BaseModel):
 
 
 chatbot = ArchetypeChatbot()
+quiz_prescorer = QuizPrescorer()
 
 
-@app.post("/upskill-judge", response_model=List[QuizResult])
-async def upskill_judge(quiz_items: List[QuizItem]):
+def build_judge_input(quiz_items: List[QuizItem]):
     all_questions = [
         {
             "question": item.question,
@@ -194,58 +343,112 @@ async def upskill_judge(quiz_items: List[QuizItem]):
         for item in quiz_items
     ]
 
-    input_text = json.dumps({"questions": all_questions})
+    return json.dumps({"questions": all_questions})
 
-    processed_results = chatbot.process_text(input_text)
 
-    results = []
-    if isinstance(processed_results, list):
-        for result in processed_results:
-            feedback = result.get("Komentar", "Tidak ada feedback.")
-            nilai = result.get("Nilai", 0)
-            results.append(QuizResult(feedback=feedback, nilai=nilai))
-    else:
-        print(f"Unexpected response format: {processed_results}")
-        raise ValueError("Response format is not as expected.")
+def to_quiz_result(result):
+    feedback = result.get("Komentar", "Tidak ada feedback.")
+    nilai = result.get("Nilai", 0)
+    return QuizResult(feedback=feedback, nilai=nilai)
 
-    return results
 
-import webrtcvad
-import soundfile as sf
-import io
-from fastapi.responses import JSONResponse
+# A plain def, so FastAPI runs the blocking Gemini call in its threadpool.
+@app.post("/upskill-judge", response_model=List[QuizResult])
+def upskill_judge(quiz_items: List[QuizItem]):
+    # Clear-cut answers are scored locally; only the rest go to the model.
+    verdicts = quiz_prescorer.prescore(quiz_items)
+    pending = [item for item, verdict in zip(quiz_items, verdicts) if verdict is None]
+
+    processed_results = []
+    if pending:
+        input_text = build_judge_input(pending)
+
+        processed_results = chatbot.process_text(input_text)
+
+        if not isinstance(processed_results, list):
+            print(f"Unexpected response format: {processed_results}")
+            raise ValueError("Response format is not as expected.")
+
+    try:
+        merged = merge_results(verdicts, processed_results)
+    except ValueError as e:
+        print(f"Judge results do not match the questions: {e}")
+        return JSONResponse(status_code=502, content={"message": "Penilaian tidak tersedia untuk semua soal, silakan coba lagi."})
+
+    return [to_quiz_result(result) for result in merged]
+
+
+def stream_judge_results(quiz_items: List[QuizItem]):
+    verdicts = quiz_prescorer.prescore(quiz_items)
+    for index, verdict in enumerate(verdicts):
+        if verdict is not None:
+            line = {"index": index, **to_quiz_result(verdict.to_judge_result()).model_dump()}
+            yield json.dumps(line) + "\n"
+
+    pending = [index for index, verdict in enumerate(verdicts) if verdict is None]
+    if not pending:
+        return
+
+    input_text = build_judge_input([quiz_items[index] for index in pending])
+    done = set()
+
+    try:
+        # Closed explicitly so an early break or a client disconnect ends the
+        # Gemini call right away instead of whenever the generator is collected.
+        with closing(chatbot.stream_text(input_text)) as results:
+            for position, result in results:
+                if position >= len(pending):
+                    break
+                index = pending[position]
+                done.add(index)
+                if result is None:
+                    line = {"index": index, "error": "Gagal membaca penilaian untuk soal ini."}
+                else:
+                    try:
+                        line = {"index": index, **to_quiz_result(result).model_dump()}
+                    except ValueError as e:
+                        print(f"Invalid judge result {index}: {e}")
+                        line = {"index": index, "error": "Gagal membaca penilaian untuk soal ini."}
+                yield json.dumps(line) + "\n"
+    except Exception as e:
+        print(f"Streaming judge failed: {e}")
+
+    for index in pending:
+        if index not in done:
+            line = {"index": index, "error": "Penilaian untuk soal ini tidak tersedia."}
+            yield json.dumps(line) + "\n"
+
+
+@app.post("/upskill-judge/stream")
+async def upskill_judge_stream(quiz_items: List[QuizItem]):
+    # Newline-delimited JSON: one {"index", "feedback", "nilai"} object per
+    # question, or {"index", "error"}. Locally scored questions come first,
+    # the rest as soon as the model finishes each one.
+    return StreamingResponse(
+        stream_judge_results(quiz_items), media_type="application/x-ndjson"
+    )
 
-NOISE_THRESHOLD = 0.02
-VAD_AGGRESSIVENESS = 2
-vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+from fastapi.concurrency import run_in_threadpool
 
-def is_noisy(audio_data, threshold):
-    rms = np.sqrt(np.mean(np.square(audio_data)))
-    return 1 if rms > threshold else 0
+from audio_processing import NOISE_THRESHOLD, VAD_SAMPLE_RATES, NoiseMonitor, check_audio
 
-def is_speech(audio_data, sample_rate):
-    audio_bytes = (audio_data * 32768).astype(np.int16).tobytes()
-    frame_duration = 30
-    frame_size = int(sample_rate * frame_duration / 1000)
-    
-    for i in range(0, len(audio_bytes), frame_size * 2):
-        frame = audio_bytes[i:i + frame_size * 2]
-        if len(frame) == frame_size * 2 and vad.is_speech(frame, sample_rate):
-            return True
-    return False
+# Largest PCM chunk accepted per WebSocket message (about 1 s of 48 kHz
+# stereo, roughly 1 ms of VAD work).
+MAX_MONITOR_CHUNK_BYTES = 48000 * 2 * 2
 
 @app.post("/submit_audio")
 async def submit_audio(file: UploadFile = File(...)):
     if file.content_type in ["audio/wav", "audio/mp3"]:
         try:
-            contents = await file.read()
-            audio_io = io.BytesIO(contents)
-            audio_data, sr = sf.read(audio_io)
+            # Decode straight from the spooled upload in blocks instead of
+            # buffering it, and off the event loop.
+            await file.seek(0)
+            audio_check = await run_in_threadpool(check_audio, file.file, NOISE_THRESHOLD)
 
-            if is_speech(audio_data, sr):
+            if audio_check.is_speech:
                 return JSONResponse(status_code=200, content={"message": "Pembicaraan terdeteksi, bukan noise"})
             
-            noise_status = is_noisy(audio_data, NOISE_THRESHOLD)
+            noise_status = audio_check.is_noisy(NOISE_THRESHOLD)
             return JSONResponse(status_code=200, content={"message": "Pindah ke tempat yang lebih tenang" if noise_status else "Tempat sudah kondusif!"})
         except Exception as e:
             return JSONResponse(status_code=500, content={"message": f"Terjadi kesalahan saat memproses file audio. Error:\n{str(e)}"})
@@ -253,6 +456,71 @@ async def submit_audio(file: UploadFile = File(...)):
     else:
         return JSONResponse(status_code=400, content={"message": "Format file tidak didukung"})
 
+
+@app.post("/transcribe")
+async def transcribe(file: UploadFile = File(...)):
+    if file.content_type not in ["audio/wav", "audio/mp3"]:
+        return JSONResponse(status_code=400, content={"message": "Format file tidak didukung"})
+
+    try:
+        transcriber = await run_in_threadpool(get_transcriber)
+    except (TranscriberUnavailable, ImportError) as e:
+        print(f"Transcriber unavailable: {e}")
+        return JSONResponse(status_code=503, content={"message": "Layanan transkripsi belum tersedia"})
+
+    try:
+        await file.seek(0)
+        with time_stage("transcribe", "decode"):
+            audio = await run_in_threadpool(load_audio, file.file)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"message": f"File audio tidak dapat diproses. Error:\n{str(e)}"})
+
+    start = time.perf_counter()
+    with time_stage("transcribe", "inference"):
+        texts = [await asyncio.wrap_future(future) for future in transcriber.submit_audio(audio)]
+    processing_time = time.perf_counter() - start
+    duration = audio.size / SAMPLE_RATE
+
+    return {
+        "text": " ".join(texts).strip(),
+        "duration": duration,
+        "processing_time": processing_time,
+        "real_time_factor": processing_time / duration if duration else 0.0,
+    }
+
+
+@app.websocket("/ws/noise_monitor")
+async def noise_monitor(websocket: WebSocket, sample_rate: int = 16000, channels: int = 1):
+    # Clients send binary frames of little-endian int16 PCM as it is recorded
+    # and receive a JSON verdict for the last second after every chunk.
+    await websocket.accept()
+    if not (8000 <= sample_rate <= max(VAD_SAMPLE_RATES)) or channels not in (1, 2):
+        await websocket.send_json({"message": "Format audio tidak didukung"})
+        await websocket.close(code=1003)
+        return
+
+    monitor = NoiseMonitor(sample_rate=sample_rate, channels=channels)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            chunk = message.get("bytes")
+            if chunk is None:
+                await websocket.send_json({"message": "Kirim audio sebagai frame biner"})
+                await websocket.close(code=1003)
+                return
+            if len(chunk) > MAX_MONITOR_CHUNK_BYTES:
+                await websocket.close(code=1009)
+                return
+            # VAD runs off the event loop so hundreds of sessions do not stall
+            # other requests; awaiting each chunk keeps them in order.
+            verdict = await run_in_threadpool(monitor.feed, chunk)
+            if verdict is not None:
+                await websocket.send_json(verdict)
+    except WebSocketDisconnect:
+        pass
+
 #############################################################################################################
 
 if __name__ == "__main__":
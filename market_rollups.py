@@ -0,0 +1,192 @@
+"""Daily market aggregates across every analyzed scrape.
+
+Each posting is counted once, keyed by ``site:id``, in ``daily_counts``
+under the dimensions ``all``, ``city``, ``industry`` and ``keyword``.
+``analyze_task`` adds each new scrape; ``trends`` reads slices straight from
+the aggregate table.
+
+    python market_rollups.py backfill public/*.csv
+"""
+import argparse
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from analyst import TECH_KEYWORDS
+
+MARKET_ROLLUPS_PATH = os.getenv("MARKET_ROLLUPS_PATH", "./data/market_rollups.sqlite3")
+
+DIMENSIONS = ("all", "city", "industry", "keyword")
+GRANULARITIES = {
+    "day": "day",
+    "week": "date(day, 'weekday 0', '-6 days')",
+    "month": "substr(day, 1, 7)",
+}
+
+
+class MarketQueryError(ValueError):
+    pass
+
+
+def posting_dimensions(jobs):
+    """Long-form (posting_key, dimension, value, day) rows for a scrape."""
+    frame = pd.DataFrame({
+        "posting_key": jobs["site"].astype(str) + ":" + jobs["id"].astype(str),
+        "day": pd.to_datetime(jobs["date_posted"], errors="coerce").dt.strftime("%Y-%m-%d"),
+    })
+    frame = frame[frame["day"].notna()]
+    frame = frame[~frame["posting_key"].duplicated()]
+    jobs = jobs.loc[frame.index]
+
+    parts = [frame.assign(dimension="all", value="all")]
+    city = jobs["location"].str.split(",").str[0].str.strip()
+    parts.append(frame.assign(dimension="city", value=city))
+    if "company_industry" in jobs:
+        parts.append(frame.assign(dimension="industry", value=jobs["company_industry"]))
+
+    descriptions = jobs["description"].fillna("").str.lower()
+    for keyword in TECH_KEYWORDS:
+        found = descriptions.str.contains(keyword, regex=False)
+        parts.append(frame[found].assign(dimension="keyword", value=keyword))
+
+    rows = pd.concat(parts, ignore_index=True)
+    rows = rows[rows["value"].notna() & (rows["value"] != "")]
+    return rows[["posting_key", "dimension", "value", "day"]]
+
+
+class MarketRollups:
+    def __init__(self, path=MARKET_ROLLUPS_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings (posting_key TEXT PRIMARY KEY, day TEXT NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_counts (
+                dimension TEXT NOT NULL,
+                value TEXT NOT NULL,
+                day TEXT NOT NULL,
+                postings INTEGER NOT NULL,
+                PRIMARY KEY (dimension, value, day)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS daily_counts_day ON daily_counts (dimension, day)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add_postings(self, jobs):
+        """Fold a scrape into the rollups; postings already counted are skipped."""
+        rows = posting_dimensions(jobs)
+        keys = rows.loc[rows["dimension"] == "all", ["posting_key", "day"]]
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seen = set()
+            key_list = keys["posting_key"].tolist()
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                seen.update(
+                    key for (key,) in conn.execute(
+                        f"SELECT posting_key FROM postings WHERE posting_key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+            new_keys = keys[~keys["posting_key"].isin(seen)]
+            conn.executemany(
+                "INSERT INTO postings (posting_key, day) VALUES (?, ?)",
+                new_keys.itertuples(index=False, name=None),
+            )
+            counts = (
+                rows[rows["posting_key"].isin(new_keys["posting_key"])]
+                .groupby(["dimension", "value", "day"])
+                .size()
+            )
+            conn.executemany(
+                "INSERT INTO daily_counts (dimension, value, day, postings) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (dimension, value, day) DO UPDATE SET postings = postings + excluded.postings",
+                ((dimension, value, day, int(n)) for (dimension, value, day), n in counts.items()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(new_keys)
+
+    def trends(self, dimension="all", values=None, date_from=None, date_to=None, granularity="day", top=10):
+        if dimension not in DIMENSIONS:
+            raise MarketQueryError(f"Dimensi tidak dikenal: {dimension}. Pilihan: {', '.join(DIMENSIONS)}")
+        if granularity not in GRANULARITIES:
+            raise MarketQueryError(f"Granularitas tidak dikenal: {granularity}. Pilihan: {', '.join(GRANULARITIES)}")
+        if top is not None and top < 1:
+            raise MarketQueryError("top harus >= 1")
+
+        where = ["dimension = ?"]
+        params = [dimension]
+        if date_from is not None:
+            where.append("day >= ?")
+            params.append(str(date_from))
+        if date_to is not None:
+            where.append("day <= ?")
+            params.append(str(date_to))
+        if values:
+            where.append(f"value IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        where = " AND ".join(where)
+
+        conn = self._connect()
+        totals = conn.execute(
+            f"SELECT value, SUM(postings) AS total FROM daily_counts WHERE {where} "
+            "GROUP BY value ORDER BY total DESC, value" + (" LIMIT ?" if top else ""),
+            params + ([top] if top else []),
+        ).fetchall()
+        if not totals:
+            return []
+
+        selected = [value for value, _ in totals]
+        series = {value: {"value": value, "total": total, "points": []} for value, total in totals}
+        period = GRANULARITIES[granularity]
+        for value, bucket, postings in conn.execute(
+            f"SELECT value, {period} AS bucket, SUM(postings) FROM daily_counts "
+            f"WHERE {where} AND value IN ({','.join('?' * len(selected))}) "
+            "GROUP BY value, bucket ORDER BY bucket",
+            params + selected,
+        ):
+            series[value]["points"].append({"period": bucket, "postings": postings})
+        return [series[value] for value in selected]
+
+
+def backfill(paths, rollups=None):
+    rollups = rollups or MarketRollups()
+    for path in paths:
+        jobs = pd.read_csv(path, escapechar="\\")
+        print(f"{path}: {rollups.add_postings(jobs)} new postings")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Market rollup maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    fill = subparsers.add_parser("backfill", help="add previously scraped job CSVs")
+    fill.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+    backfill(args.paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Scrapes and LLM calls take tens of seconds, so extend the default buckets.
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "modul_ai_stage_seconds",
+    "Duration of each stage of a background task.",
+    ["task", "stage"],
+    buckets=SLOW_BUCKETS,
+)
+BACKGROUND_TASKS = Gauge(
+    "modul_ai_background_tasks",
+    "Background tasks accepted but not yet finished.",
+    ["task"],
+    multiprocess_mode="livesum",
+)
+PDF_EXTRACT_SECONDS = Histogram(
+    "modul_ai_pdf_extract_seconds",
+    "Time spent extracting text from an uploaded PDF.",
+    ["outcome"],
+)
+PDF_PAGES = Histogram(
+    "modul_ai_pdf_pages",
+    "Page count of extracted PDFs.",
+    buckets=(1, 2, 3, 5, 8, 13, 20, 50),
+)
+LLM_CALL_SECONDS = Histogram(
+    "modul_ai_llm_call_seconds",
+    "Latency of Gemini calls.",
+    ["model", "key_alias", "outcome"],
+    buckets=SLOW_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "modul_ai_llm_tokens",
+    "Tokens reported by Gemini usage metadata.",
+    ["model", "key_alias", "kind"],
+)
+LLM_RETRIES = Counter(
+    "modul_ai_llm_retries",
+    "Gemini calls repeated after a failed attempt, by the key of the failed attempt.",
+    ["model", "key_alias"],
+)
+QUIZ_PRESCORE_ITEMS = Counter(
+    "modul_ai_quiz_prescore_items",
+    "Quiz answers by pre-scoring decision; only 'forwarded' ones reach the judge model.",
+    ["decision"],
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "modul_ai_llm_calls_in_flight",
+    "Gemini calls currently waiting on the API.",
+    ["model", "key_alias"],
+    multiprocess_mode="livesum",
+)
+
+
+def key_alias(email_name):
+    # Label by the mailbox name only so full addresses do not end up in metrics.
+    return str(email_name).split("@")[0]
+
+
+@contextmanager
+def time_stage(task, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(task, stage).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_background_task(task):
+    try:
+        yield
+    finally:
+        BACKGROUND_TASKS.labels(task).dec()
+
+
+def background_task_queued(task):
+    BACKGROUND_TASKS.labels(task).inc()
+
+
+@contextmanager
+def track_llm_call(model, alias):
+    start = time.perf_counter()
+    outcome = "error"
+    LLM_QUEUE_DEPTH.labels(model, alias).inc()
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        LLM_QUEUE_DEPTH.labels(model, alias).dec()
+        LLM_CALL_SECONDS.labels(model, alias, outcome).observe(time.perf_counter() - start)
+
+
+class StreamedLlmCall:
+    """``track_llm_call`` for a streamed response consumed between yields.
+
+    Only time spent inside ``waiting()`` counts as latency, so a slow consumer
+    does not inflate it, and a stream closed early by its consumer is recorded
+    as "cancelled" rather than "error".
+    """
+
+    def __init__(self, model, alias):
+        self.model = model
+        self.alias = alias
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        LLM_QUEUE_DEPTH.labels(self.model, self.alias).inc()
+        return self
+
+    @contextmanager
+    def waiting(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            outcome = "ok"
+        elif issubclass(exc_type, GeneratorExit):
+            outcome = "cancelled"
+        else:
+            outcome = "error"
+        LLM_QUEUE_DEPTH.labels(self.model, self.alias).dec()
+        LLM_CALL_SECONDS.labels(self.model, self.alias, outcome).observe(self.elapsed)
+        return False
+
+
+def record_llm_usage(model, alias, response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+        count = getattr(usage, field, 0) or 0
+        if count:
+            LLM_TOKENS.labels(model, alias, kind).inc(count)
+
+
+def multiprocess_enabled():
+    # Set by serve.py before any worker starts; each worker then writes its
+    # samples to this directory and a scrape of any worker sums them all.
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def mark_worker_dead(pid):
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
+
+
+def render_metrics():
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
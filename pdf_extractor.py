@@ -0,0 +1,207 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import PyPDF2
+
+from metrics import PDF_EXTRACT_SECONDS, PDF_PAGES
+
+MAX_PDF_BYTES = int(os.getenv("MAX_PDF_BYTES", 10 * 1024 * 1024))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", 20))
+MAX_TEXT_CHARS = int(os.getenv("MAX_PDF_TEXT_CHARS", 200_000))
+
+# Documents with at least this many pages are split across worker processes;
+# PyPDF2 is pure Python, so threads would only contend on the GIL.
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", 8))
+PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Per process, so with several workers a repeat upload only hits when it
+# lands on the same one. Repeat CV reviews are answered from the shared
+# result cache (result_cache.py) before extraction is reached.
+TEXT_CACHE_SIZE = int(os.getenv("PDF_TEXT_CACHE_SIZE", 256))
+
+# Every document is parsed in its own worker processes, so a malicious PDF
+# can be abandoned after EXTRACT_TIMEOUT seconds instead of pinning a request
+# thread.
+EXTRACT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT", 15))
+WORKER_MEMORY_BYTES = int(os.getenv("PDF_WORKER_MEMORY_BYTES", 512 * 1024 * 1024))
+
+
+class PdfExtractionError(ValueError):
+    pass
+
+
+def sanitize_text(text: str) -> str:
+    return text.encode("utf-8", "surrogatepass").decode("utf-8", "ignore")
+
+
+def pdf_content_hash(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _count_pages(pdf_bytes):
+    return len(PyPDF2.PdfReader(BytesIO(pdf_bytes)).pages)
+
+
+def _extract_page_range(pdf_bytes, start, stop):
+    pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_bytes))
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _limit_worker_memory():
+    # PyPDF2 inflates whole streams in memory, so a small FlateDecode bomb
+    # can expand to gigabytes. Cap each pool process's address space above
+    # what it inherited; the bomb then fails with MemoryError in the worker.
+    try:
+        import resource
+
+        with open("/proc/self/statm") as statm:
+            current = int(statm.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+        limit = current + WORKER_MEMORY_BYTES
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, OSError, ValueError):
+        pass
+
+
+class _TextCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            text = self._items.get(key)
+            if text is not None:
+                self._items.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._items[key] = text
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+_text_cache = _TextCache(TEXT_CACHE_SIZE)
+
+
+def _mp_context():
+    # Workers are forked from a forkserver rather than the server itself, so
+    # they inherit none of its threads, held locks or memory. Each worker
+    # still re-imports the entry script as ``__mp_main__``; serve.py and
+    # main.production.py only import serve, which keeps that to ~50 ms.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+_context = _mp_context()
+
+
+def _document_executor():
+    # One pool per document: a timeout kills only that document's workers,
+    # never the extractions of other requests running at the same time.
+    return ProcessPoolExecutor(
+        max_workers=PARALLEL_WORKERS, mp_context=_context, initializer=_limit_worker_memory
+    )
+
+
+def _kill(executor):
+    # A timed-out task keeps running in its process until it is killed.
+    for process in list((executor._processes or {}).values()):
+        process.kill()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_in_pool(executor, calls, deadline):
+    futures = [executor.submit(fn, *args) for fn, *args in calls]
+    results = []
+    try:
+        for future in futures:
+            results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+    except FuturesTimeout:
+        _kill(executor)
+        raise PdfExtractionError(f"Ekstraksi PDF melebihi batas waktu {EXTRACT_TIMEOUT:g} detik") from None
+    except BrokenProcessPool:
+        raise PdfExtractionError("PDF tidak dapat diproses") from None
+    except MemoryError:
+        raise PdfExtractionError("PDF membutuhkan memori terlalu besar untuk diekstrak") from None
+    return results
+
+
+def _extract_pages(executor, pdf_bytes, num_pages, deadline):
+    workers = PARALLEL_WORKERS if num_pages >= PARALLEL_PAGE_THRESHOLD else 1
+    chunk = max(-(-num_pages // workers), 1)
+    calls = [
+        (_extract_page_range, pdf_bytes, start, min(start + chunk, num_pages))
+        for start in range(0, num_pages, chunk)
+    ]
+    return [page for pages in _run_in_pool(executor, calls, deadline) for page in pages]
+
+
+def _extract_in_pool(executor, pdf_bytes, max_pages, deadline):
+    try:
+        (num_pages,) = _run_in_pool(executor, [(_count_pages, pdf_bytes)], deadline)
+    except PdfExtractionError:
+        raise
+    except Exception as e:
+        raise PdfExtractionError(f"PDF tidak dapat dibaca: {e}") from e
+
+    if num_pages > max_pages:
+        raise PdfExtractionError(
+            f"PDF memiliki terlalu banyak halaman ({num_pages}, maksimal {max_pages})"
+        )
+
+    try:
+        return _extract_pages(executor, pdf_bytes, num_pages, deadline), num_pages
+    except PdfExtractionError:
+        raise
+    except Exception as e:
+        raise PdfExtractionError(f"Gagal mengekstrak teks PDF: {e}") from e
+
+
+def extract_text_from_pdf_bytes(pdf_bytes, max_bytes=MAX_PDF_BYTES, max_pages=MAX_PDF_PAGES):
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        text, outcome = _extract_text(pdf_bytes, max_bytes, max_pages)
+        return text
+    finally:
+        PDF_EXTRACT_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+
+
+def _extract_text(pdf_bytes, max_bytes, max_pages):
+    if not pdf_bytes:
+        raise PdfExtractionError("PDF kosong")
+    if len(pdf_bytes) > max_bytes:
+        raise PdfExtractionError(
+            f"PDF terlalu besar ({len(pdf_bytes)} bytes, maksimal {max_bytes} bytes)"
+        )
+
+    content_hash = pdf_content_hash(pdf_bytes)
+    cached = _text_cache.get(content_hash)
+    if cached is not None:
+        return cached, "cached"
+
+    deadline = time.monotonic() + EXTRACT_TIMEOUT
+    executor = _document_executor()
+    try:
+        pages, num_pages = _extract_in_pool(executor, pdf_bytes, max_pages, deadline)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    PDF_PAGES.observe(num_pages)
+    text = sanitize_text("".join(pages))[:MAX_TEXT_CHARS]
+    _text_cache.put(content_hash, text)
+    return text, "ok"
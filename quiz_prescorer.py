@@ -0,0 +1,279 @@
+"""Local scoring of quiz answers before they reach the judge model.
+
+Clear-cut items are scored here with a templated result: normalized exact
+matches and empty or "tidak tahu" answers. Everything else is left for
+``ArchetypeChatbot``. Thresholds come from the optional ``quiz_prescoring``
+section of ``config.yaml``:
+
+    quiz_prescoring:
+      enabled: true
+      accept_similarity: null
+      reject_similarity: null
+
+Char n-grams cannot tell a right answer from its opposite ("dapat diubah"
+and "tidak dapat diubah" score 0.99) or a paraphrase from a wrong answer
+("LIFO" shares nothing with "Stack"), so by default nothing is decided on
+similarity. ``accept_similarity`` opts in to accepting typos: the answer must
+reach that similarity, have the key's word count, and differ from it only by
+single-edit typos in words of at least ``min_typo_chars`` characters that
+start with the same letter, never in a negation word. ``reject_similarity``
+opts in to rejecting answers at or below that similarity when both they and
+the key have at least ``min_similarity_chars`` characters. Check changes with
+the agreement report:
+
+    python quiz_prescorer.py report judged.jsonl
+"""
+import argparse
+import json
+import re
+import unicodedata
+from contextlib import closing
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from metrics import QUIZ_PRESCORE_ITEMS
+from settings import config
+
+DEFAULTS = {
+    "enabled": True,
+    # Cosine similarity of char 2-4 grams at or above which an answer may
+    # count as the key with a typo, and at or below which it counts as
+    # unrelated. Both are off unless set.
+    "accept_similarity": None,
+    "reject_similarity": None,
+    # Shorter keys (and answers, for rejection) are never decided on similarity.
+    "min_similarity_chars": 8,
+    # Shorter words must match the key exactly for a typo to be accepted.
+    "min_typo_chars": 5,
+    "negation_words": ["tidak", "tak", "bukan", "belum", "jangan", "gak", "nggak", "not", "no", "non", "never"],
+    # Same pass mark the judge prompt uses.
+    "pass_mark": 70,
+    "dont_know_answers": ["tidak tahu", "tidak tau", "gak tahu", "gak tau", "nggak tahu", "ga tau", "tidak ada", "idk", "-", "?"],
+    "correct_feedback": "Jawaban kamu sudah tepat! Pertahankan semangat belajarmu.",
+    "empty_feedback": "Kamu belum menjawab soal ini. Jawaban yang seharusnya: {answer}. Tetap semangat belajar ya!",
+    "incorrect_feedback": "Jawaban kamu belum sesuai. Jawaban yang seharusnya: {answer}. Jangan menyerah, terus tingkatkan kemampuanmu!",
+}
+
+TRAILING_PUNCTUATION = ".,;:!?\"'`"
+NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def load_settings(configs=config):
+    return {**DEFAULTS, **(configs.get("quiz_prescoring") or {})}
+
+
+def normalize_answer(text):
+    text = unicodedata.normalize("NFKC", str(text or "")).casefold()
+    return " ".join(text.split()).strip(TRAILING_PUNCTUATION + " ")
+
+
+class LocalVerdict:
+    def __init__(self, decision, nilai, feedback, similarity):
+        self.decision = decision
+        self.nilai = nilai
+        self.feedback = feedback
+        self.similarity = similarity
+
+    def to_judge_result(self):
+        return {"Nilai": self.nilai, "Komentar": self.feedback}
+
+
+class QuizPrescorer:
+    def __init__(self, settings=None):
+        self.settings = settings or load_settings()
+        self.dont_know = {normalize_answer(a) for a in self.settings["dont_know_answers"]}
+        self.negations = {normalize_answer(w) for w in self.settings["negation_words"]}
+        # Stateless, so one instance is safe to share across threads.
+        self.vectorizer = HashingVectorizer(
+            analyzer="char_wb", ngram_range=(2, 4), alternate_sign=False, norm="l2", n_features=2**18
+        )
+
+    def similarities(self, answers, user_answers):
+        if not answers:
+            return np.array([])
+        keys = self.vectorizer.transform(answers)
+        given = self.vectorizer.transform(user_answers)
+        # Rows are L2-normalized, so the row-wise dot product is the cosine.
+        return np.asarray(keys.multiply(given).sum(axis=1)).ravel()
+
+    def prescore(self, quiz_items):
+        """One LocalVerdict per item, or None where the model should judge."""
+        if not self.settings["enabled"]:
+            QUIZ_PRESCORE_ITEMS.labels("forwarded").inc(len(quiz_items))
+            return [None] * len(quiz_items)
+
+        answers = [normalize_answer(item.answer) for item in quiz_items]
+        user_answers = [normalize_answer(item.userAnswer) for item in quiz_items]
+        scores = self.similarities(answers, user_answers)
+
+        verdicts = []
+        for item, answer, user_answer, score in zip(quiz_items, answers, user_answers, scores):
+            verdict = self.decide(item.answer, answer, user_answer, float(score))
+            QUIZ_PRESCORE_ITEMS.labels(verdict.decision if verdict else "forwarded").inc()
+            verdicts.append(verdict)
+        return verdicts
+
+    def decide(self, raw_answer, answer, user_answer, score):
+        settings = self.settings
+        # Checked first: a key such as "Tidak ada" is also a "don't know" answer.
+        if user_answer and user_answer == answer:
+            return LocalVerdict("exact", 100, settings["correct_feedback"], 1.0)
+        if not user_answer or user_answer in self.dont_know:
+            return LocalVerdict("empty", 0, settings["empty_feedback"].format(answer=raw_answer), score)
+        min_chars = settings["min_similarity_chars"]
+        accept_similarity = settings["accept_similarity"]
+        if (
+            accept_similarity is not None
+            and score >= accept_similarity
+            and len(answer) >= min_chars
+            and NUMBER_PATTERN.findall(answer) == NUMBER_PATTERN.findall(user_answer)
+            and self.only_typos(answer, user_answer)
+        ):
+            return LocalVerdict("similar", round(score * 100), settings["correct_feedback"], score)
+        reject_similarity = settings["reject_similarity"]
+        if (
+            reject_similarity is not None
+            and score <= reject_similarity
+            and len(answer) >= min_chars
+            and len(user_answer) >= min_chars
+        ):
+            return LocalVerdict(
+                "unrelated", round(score * 100), settings["incorrect_feedback"].format(answer=raw_answer), score
+            )
+        return None
+
+    def only_typos(self, answer, user_answer):
+        """True if the words of ``user_answer`` are those of ``answer`` up to
+        one typo each; "synchronous" and "asynchronous" are not."""
+        words, user_words = answer.split(), user_answer.split()
+        if len(words) != len(user_words):
+            return False
+        for word, user_word in zip(words, user_words):
+            if word == user_word:
+                continue
+            if (
+                word in self.negations
+                or user_word in self.negations
+                or min(len(word), len(user_word)) < self.settings["min_typo_chars"]
+                or word[0] != user_word[0]
+                or edit_distance(word, user_word) > 1
+            ):
+                return False
+        return True
+
+
+def edit_distance(a, b):
+    """Levenshtein distance counting an adjacent transposition as one edit."""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def merge_results(verdicts, model_results):
+    """Put model results back into the positions left open by ``prescore``.
+
+    Raises ValueError if the model did not return exactly one result per
+    open position, since the results could not be matched to questions.
+    """
+    model_results = list(model_results)
+    expected = sum(verdict is None for verdict in verdicts)
+    if len(model_results) != expected:
+        raise ValueError(f"Judge returned {len(model_results)} results for {expected} questions")
+    model_results = iter(model_results)
+    return [
+        verdict.to_judge_result() if verdict is not None else next(model_results)
+        for verdict in verdicts
+    ]
+
+
+class _Item:
+    def __init__(self, record):
+        self.question = record.get("question", "")
+        self.answer = record.get("answer", "")
+        self.userAnswer = record.get("userAnswer", "")
+
+
+def ask_model(items, batch_size=20):
+    from archetype_chatbot import ArchetypeChatbot
+
+    chatbot = ArchetypeChatbot()
+    nilai = []
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        payload = json.dumps({
+            "questions": [
+                {"question": i.question, "correct_answer": i.answer, "user_answer": i.userAnswer}
+                for i in batch
+            ]
+        })
+        with closing(chatbot.stream_text(payload)) as stream:
+            results = dict(stream)
+        nilai.extend((results.get(i) or {}).get("Nilai") for i in range(len(batch)))
+    return nilai
+
+
+def agreement_report(records, prescorer, model_nilai):
+    items = [_Item(record) for record in records]
+    verdicts = prescorer.prescore(items)
+    pass_mark = prescorer.settings["pass_mark"]
+
+    by_decision = {}
+    disagreements = []
+    for item, verdict, nilai in zip(items, verdicts, model_nilai):
+        decision = verdict.decision if verdict else "forwarded"
+        stats = by_decision.setdefault(decision, {"items": 0, "compared": 0, "agree": 0, "abs_diff": 0.0})
+        stats["items"] += 1
+        if verdict is None or nilai is None:
+            continue
+        stats["compared"] += 1
+        stats["abs_diff"] += abs(verdict.nilai - float(nilai))
+        if (verdict.nilai >= pass_mark) == (float(nilai) >= pass_mark):
+            stats["agree"] += 1
+        else:
+            disagreements.append((decision, item, verdict.nilai, nilai))
+
+    total = len(items)
+    local = total - by_decision.get("forwarded", {}).get("items", 0)
+    print(f"{total} items, {local} decided locally ({local / max(total, 1):.0%}), pass mark {pass_mark}")
+    print(f"{'decision':<10} {'items':>6} {'compared':>9} {'agree':>7} {'mean |diff|':>12}")
+    for decision, stats in sorted(by_decision.items()):
+        compared = stats["compared"]
+        agree = f"{stats['agree'] / compared:.0%}" if compared else "-"
+        diff = f"{stats['abs_diff'] / compared:.1f}" if compared else "-"
+        print(f"{decision:<10} {stats['items']:>6} {compared:>9} {agree:>7} {diff:>12}")
+    for decision, item, local_nilai, nilai in disagreements[:20]:
+        print(f"- [{decision}] local {local_nilai} vs model {nilai}: {item.answer!r} / {item.userAnswer!r}")
+    return by_decision
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quiz pre-scoring tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report = subparsers.add_parser("report", help="compare local verdicts with the judge model")
+    report.add_argument("path", help="JSONL with question, answer, userAnswer and the model's nilai")
+    report.add_argument("--ask-model", action="store_true", help="ask the judge for items without nilai")
+    args = parser.parse_args()
+
+    with open(args.path) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    model_nilai = [record.get("nilai") for record in records]
+    missing = [i for i, nilai in enumerate(model_nilai) if nilai is None]
+    if args.ask_model and missing:
+        for i, nilai in zip(missing, ask_model([_Item(records[i]) for i in missing])):
+            model_nilai[i] = nilai
+    agreement_report(records, QuizPrescorer(), model_nilai)
+
+
+if __name__ == "__main__":
+    main()
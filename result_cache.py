@@ -0,0 +1,137 @@
+"""CV review cache shared by every worker process.
+
+Results and in-flight claims live in SQLite (``CV_RESULT_CACHE_PATH``), so a
+repeat upload is served from the cache and a duplicate of a review still in
+progress is coalesced onto it, whichever worker each request lands on.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CV_RESULT_CACHE_PATH = os.getenv("CV_RESULT_CACHE_PATH", "./data/cv_results.sqlite3")
+# A claim older than this is assumed to belong to a worker that died, and the
+# next request for the key takes it over together with its waiters.
+CV_CLAIM_TTL = float(os.getenv("CV_CLAIM_TTL", 30 * 60))
+
+
+def hash_cv_request(pdf_bytes, json_data, prompt_fingerprint):
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(pdf_bytes).digest())
+    digest.update(
+        json.dumps(json_data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    )
+    digest.update(str(prompt_fingerprint).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """LRU cache with per-entry TTL and in-flight request coalescing."""
+
+    def __init__(self, ttl_seconds, maxsize=1024, path=CV_RESULT_CACHE_PATH, claim_ttl=CV_CLAIM_TTL):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self.path = path
+        self.claim_ttl = claim_ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS inflight (key TEXT PRIMARY KEY, claimed_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS waiters (key TEXT NOT NULL, waiter TEXT NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS waiters_key ON waiters (key)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute("DELETE FROM results WHERE key = ? AND expires_at < ?", (key, now))
+            return None
+        conn.execute("UPDATE results SET used_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl_seconds, now),
+            )
+            conn.execute("DELETE FROM results WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used_at "
+                "LIMIT max((SELECT COUNT(*) FROM results) - ?, 0))",
+                (self.maxsize,),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self, key, waiter):
+        """Return True if the caller should compute ``key``; otherwise ``waiter``
+        is queued on the computation already in progress."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT claimed_at FROM inflight WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] > now - self.claim_ttl:
+                conn.execute("INSERT INTO waiters (key, waiter) VALUES (?, ?)", (key, waiter))
+                claimed = False
+            else:
+                conn.execute("INSERT OR REPLACE INTO inflight (key, claimed_at) VALUES (?, ?)", (key, now))
+                claimed = True
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def release(self, key):
+        """Finish the in-flight computation for ``key`` and return queued waiters."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            waiters = [
+                waiter for (waiter,) in conn.execute(
+                    "SELECT waiter FROM waiters WHERE key = ? ORDER BY rowid", (key,)
+                )
+            ]
+            conn.execute("DELETE FROM waiters WHERE key = ?", (key,))
+            conn.execute("DELETE FROM inflight WHERE key = ?", (key,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return waiters
@@ -0,0 +1,98 @@
+"""Production server: gunicorn managing several uvicorn workers.
+
+The app, configuration and NLTK corpora are loaded once in the master process
+and shared copy-on-write by the forked workers.
+
+    python serve.py --workers 4 --port 8001
+    python serve.py --certfile fullchain.pem --keyfile privkey.pem
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+
+def prepare_metrics_dir(path):
+    # Stale files from a previous run would be summed into the new totals.
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+
+
+def child_exit(server, worker):
+    from metrics import mark_worker_dead
+
+    mark_worker_dead(worker.pid)
+
+
+def load_service(preload_transcriber=False):
+    import analyst
+
+    analyst.preload()
+    from main import app
+
+    if preload_transcriber:
+        from transcriber import TranscriberUnavailable, get_transcriber
+
+        try:
+            get_transcriber()
+        except TranscriberUnavailable as e:
+            print(f"Transcription disabled: {e}")
+    return app
+
+
+class ModulAIServer(BaseApplication):
+    def __init__(self, options, preload_transcriber=False):
+        self.options = options
+        self.preload_transcriber = preload_transcriber
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return load_service(self.preload_transcriber)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"),
+                        help="main.production.py passes 0.0.0.0 to listen publicly")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8001)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--timeout", type=int, default=120, help="seconds before a silent worker is restarted")
+    parser.add_argument("--certfile", default=os.getenv("SSL_CERTFILE"))
+    parser.add_argument("--keyfile", default=os.getenv("SSL_KEYFILE"))
+    parser.add_argument("--metrics-dir", default=os.getenv(
+        "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "modul-ai-metrics")
+    ))
+    parser.add_argument("--preload-transcriber", action="store_true",
+                        default=os.getenv("PRELOAD_TRANSCRIBER", "0") == "1")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    prepare_metrics_dir(args.metrics_dir)
+
+    options = {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": args.timeout,
+        "graceful_timeout": 30,
+        "child_exit": child_exit,
+    }
+    if args.certfile and args.keyfile:
+        options["certfile"] = args.certfile
+        options["keyfile"] = args.keyfile
+
+    ModulAIServer(options, args.preload_transcriber).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Process-wide configuration and Gemini client state.
+
+``config.yaml`` is read once here (``MODUL_AI_CONFIG`` overrides the path)
+and shared by every module. API-key rotation and the per-key Gemini clients
+live here too, so they can be made safe to use from threads and to reset
+after the server forks its workers.
+"""
+import os
+import threading
+
+import google.generativeai as genai
+import yaml
+from google.generativeai import client as genai_client
+
+CONFIG_PATH = os.getenv("MODUL_AI_CONFIG", "./config.yaml")
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path, "r") as file:
+        return yaml.safe_load(file)
+
+
+config = load_config()
+
+
+class KeyRotator:
+    """Round-robin over [api_key, email] pairs, shared by all threads."""
+
+    def __init__(self, keys):
+        self.keys = [tuple(pair) for pair in keys or []]
+        self._lock = threading.Lock()
+        self._pointer = 0
+
+    def next(self):
+        if not self.keys:
+            return None
+        with self._lock:
+            pair = self.keys[self._pointer]
+            self._pointer = (self._pointer + 1) % len(self.keys)
+        return pair
+
+    def reseed(self):
+        # Forked workers would otherwise all start on the same key.
+        self._lock = threading.Lock()
+        self._pointer = os.getpid() % len(self.keys) if self.keys else 0
+
+
+_rotators = {}
+_rotators_lock = threading.Lock()
+
+
+def shared_key_rotator(keys):
+    """One rotator per key collection, so every analyst instance shares the pointer."""
+    key = tuple(tuple(pair) for pair in keys or [])
+    with _rotators_lock:
+        rotator = _rotators.get(key)
+        if rotator is None:
+            rotator = _rotators[key] = KeyRotator(key)
+        return rotator
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _generative_client(api_key):
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            # configure() only swaps the library's default clients; under the
+            # lock the one fetched right after it is built for this key.
+            genai.configure(api_key=api_key)
+            client = _clients[api_key] = genai_client.get_default_generative_client()
+        return client
+
+
+def generative_model(api_key, **kwargs):
+    """Build a GenerativeModel bound to ``api_key``.
+
+    ``genai.configure`` swaps a single process-wide client, so two requests
+    configuring different keys at once could send each other's calls. Each
+    key gets its own client instead, set on the model before its first call
+    (the slot it would otherwise fill lazily; google-generativeai is pinned
+    in requirements.txt for this).
+    """
+    model = genai.GenerativeModel(**kwargs)
+    model._client = _generative_client(api_key)
+    return model
+
+
+def _after_fork_in_child():
+    # gRPC channels and locks inherited from the parent are not usable in the
+    # child; drop them and let each worker create its own.
+    global _clients_lock, _rotators_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+    _rotators_lock = threading.Lock()
+    for rotator in _rotators.values():
+        rotator.reseed()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
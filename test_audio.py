@@ -1,12 +1,11 @@
 
 from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-import io
-import soundfile as sf
-import numpy as np
-import webrtcvad
+
+from audio_processing import NOISE_THRESHOLD, check_audio
 
 app = FastAPI()
 app.add_middleware(
@@ -20,37 +19,17 @@ app.add_middleware(
 class TextSubmission(BaseModel):
     text: str
 
-NOISE_THRESHOLD = 0.02
-VAD_AGGRESSIVENESS = 2
-vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
-
-def is_noisy(audio_data, threshold):
-    rms = np.sqrt(np.mean(np.square(audio_data)))
-    return 1 if rms > threshold else 0
-
-def is_speech(audio_data, sample_rate):
-    audio_bytes = (audio_data * 32768).astype(np.int16).tobytes()
-    frame_duration = 30
-    frame_size = int(sample_rate * frame_duration / 1000)
-    
-    for i in range(0, len(audio_bytes), frame_size * 2):
-        frame = audio_bytes[i:i + frame_size * 2]
-        if len(frame) == frame_size * 2 and vad.is_speech(frame, sample_rate):
-            return True
-    return False
-
 @app.post("/submit_audio")
 async def submit_audio(file: UploadFile = File(...)):
     if file.content_type in ["audio/wav", "audio/mp3"]:
         try:
-            contents = await file.read()
-            audio_io = io.BytesIO(contents)
-            audio_data, sr = sf.read(audio_io)
+            await file.seek(0)
+            audio_check = await run_in_threadpool(check_audio, file.file, NOISE_THRESHOLD)
 
-            if is_speech(audio_data, sr):
+            if audio_check.is_speech:
                 return JSONResponse(status_code=200, content={"message": "Pembicaraan terdeteksi, bukan noise"})
             
-            noise_status = is_noisy(audio_data, NOISE_THRESHOLD)
+            noise_status = audio_check.is_noisy(NOISE_THRESHOLD)
             return JSONResponse(status_code=200, content={"message": "Pindah ke tempat yang lebih tenang" if noise_status else "Tempat sudah kondusif!"})
         except Exception as e:
             return JSONResponse(status_code=500, content={"message": f"Terjadi kesalahan saat memproses file audio. Error:\n{str(e)}"})
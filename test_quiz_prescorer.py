@@ -0,0 +1,88 @@
+"""Local quiz pre-scoring tests; no model is called.
+
+    python -m pytest test_quiz_prescorer.py
+"""
+import types
+
+import pytest
+
+OPPOSITES = [
+    ("Tuple tidak dapat diubah", "Tuple dapat diubah"),
+    ("Primary key harus unik dan tidak boleh NULL", "Primary key tidak harus unik dan boleh NULL"),
+    ("GET digunakan untuk mengambil data", "POST digunakan untuk mengambil data"),
+    ("synchronous", "asynchronous"),
+]
+
+
+@pytest.fixture(scope="module")
+def quiz_prescorer(tmp_path_factory):
+    # settings reads config.yaml on import.
+    config_path = tmp_path_factory.mktemp("config") / "config.yaml"
+    config_path.write_text("GEMINI_API_KEY_COLLECTION: [[test-key, test@example.com]]\n")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("MODUL_AI_CONFIG", str(config_path))
+        import quiz_prescorer
+    return quiz_prescorer
+
+
+def prescorer(module, **settings):
+    return module.QuizPrescorer({**module.DEFAULTS, **settings})
+
+
+def item(answer, user_answer):
+    return types.SimpleNamespace(question="", answer=answer, userAnswer=user_answer)
+
+
+def decisions(scorer, pairs):
+    verdicts = scorer.prescore([item(answer, user_answer) for answer, user_answer in pairs])
+    return [verdict.decision if verdict else None for verdict in verdicts]
+
+
+@pytest.mark.parametrize("accept_similarity", [None, 0.9])
+def test_opposite_answers_are_left_to_the_model(quiz_prescorer, accept_similarity):
+    scorer = prescorer(quiz_prescorer, accept_similarity=accept_similarity)
+
+    assert decisions(scorer, OPPOSITES) == [None] * len(OPPOSITES)
+
+
+def test_defaults_only_decide_exact_and_empty_answers(quiz_prescorer):
+    scorer = prescorer(quiz_prescorer)
+
+    verdicts = scorer.prescore([
+        item("Stack", "stack."),
+        item("Tidak ada", "tidak ada"),
+        item("Stack", "Tidak tahu"),
+        item("Tuple tidak dapat diubah", "Tuple tidak dapat dibuah"),
+    ])
+
+    assert [(v.decision, v.nilai) for v in verdicts[:3]] == [("exact", 100), ("exact", 100), ("empty", 0)]
+    assert verdicts[3] is None
+
+
+def test_opt_in_accepts_single_typos_only(quiz_prescorer):
+    scorer = prescorer(quiz_prescorer, accept_similarity=0.7)
+
+    assert decisions(scorer, [
+        ("Tuple tidak dapat diubah", "Tuple tidak dapat dibuah"),
+        ("Tuple tidak dapat diubah", "Tuple tidak dapat diubah sama sekali"),
+        ("Tuple tidak dapat diubah", "Tuple tdak dapat diubah"),
+        ("Lock digunakan untuk sinkronisasi", "Lack digunakan untuk sinkronisasi"),
+    ]) == ["similar", None, None, None]
+
+
+def test_merge_results_fills_open_positions(quiz_prescorer):
+    verdicts = prescorer(quiz_prescorer).prescore([item("Stack", "stack"), item("Queue", "FIFO")])
+
+    merged = quiz_prescorer.merge_results(verdicts, [{"Nilai": 90, "Komentar": "Bagus"}])
+
+    assert merged == [
+        {"Nilai": 100, "Komentar": quiz_prescorer.DEFAULTS["correct_feedback"]},
+        {"Nilai": 90, "Komentar": "Bagus"},
+    ]
+
+
+def test_merge_results_rejects_missing_model_results(quiz_prescorer):
+    verdicts = prescorer(quiz_prescorer).prescore([item("Stack", "stack"), item("Queue", "FIFO")])
+
+    with pytest.raises(ValueError):
+        quiz_prescorer.merge_results(verdicts, [])
@@ -0,0 +1,98 @@
+"""Transcription tests against a tiny randomly initialised Whisper checkpoint.
+
+    python -m pytest test_transcriber.py
+"""
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import transcriber
+from transcriber import SAMPLE_RATE, BatchingTranscriber, WhisperEngine, create_tiny_checkpoint
+
+
+@pytest.fixture(scope="module")
+def tiny_checkpoint(tmp_path_factory):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    return create_tiny_checkpoint(str(tmp_path_factory.mktemp("whisper-tiny")))
+
+
+class RecordingEngine(WhisperEngine):
+    def __init__(self, model_dir):
+        super().__init__(model_dir=model_dir, quantize=False)
+        self.batch_sizes = []
+
+    def transcribe_batch(self, chunks):
+        self.batch_sizes.append(len(chunks))
+        return super().transcribe_batch(chunks)
+
+
+def noise(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    return (0.1 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+def test_transcribe_returns_text(tiny_checkpoint):
+    batcher = BatchingTranscriber(WhisperEngine(model_dir=tiny_checkpoint))
+    assert isinstance(batcher.transcribe(noise(2)), str)
+
+
+def test_chunks_of_one_recording_are_decoded_in_one_batch(tiny_checkpoint):
+    engine = RecordingEngine(tiny_checkpoint)
+    # Long enough that only the first call can start before the rest are queued.
+    batcher = BatchingTranscriber(engine, max_batch_size=8, max_wait_ms=500)
+    audio = noise(70)
+
+    futures = batcher.submit_audio(audio)
+    texts = [future.result(timeout=120) for future in futures]
+
+    assert len(texts) == 3
+    assert engine.batch_sizes == [3]
+    # Batching must not change what each chunk decodes to.
+    assert texts == engine.transcribe_batch(transcriber.split_chunks(audio))
+
+
+def test_max_batch_size_splits_batches(tiny_checkpoint):
+    engine = RecordingEngine(tiny_checkpoint)
+    batcher = BatchingTranscriber(engine, max_batch_size=2, max_wait_ms=500)
+
+    futures = batcher.submit_audio(noise(70))
+    for future in futures:
+        future.result(timeout=120)
+
+    assert engine.batch_sizes == [2, 1]
+
+
+def wav_bytes(audio):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(SAMPLE_RATE)
+        file.writeframes((audio * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def test_transcribe_endpoint_without_model_returns_503(tmp_path, monkeypatch):
+    pytest.importorskip("jobspy")
+    from fastapi.testclient import TestClient
+
+    (tmp_path / "config.yaml").write_text(
+        "GEMINI_API_KEY_COLLECTION: [[test-key, test@example.com]]\n"
+        "generation_config: {temperature: 1}\n"
+    )
+    monkeypatch.setenv("MODUL_AI_CONFIG", str(tmp_path / "config.yaml"))
+    monkeypatch.setenv("WEBHOOK_OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    # No ./whisper-small-id here, so loading the model fails.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(transcriber, "_transcriber", None)
+    import main as service
+
+    response = TestClient(service.app).post(
+        "/transcribe", files={"file": ("sample.wav", wav_bytes(noise(1)), "audio/wav")}
+    )
+
+    assert response.status_code == 503
+    assert response.json() == {"message": "Layanan transkripsi belum tersedia"}
@@ -0,0 +1,276 @@
+"""CPU transcription with the fine-tuned Indonesian Whisper model.
+
+The checkpoint produced by ``whisper_finetuning.ipynb`` (``./whisper-small-id``
+by default) is loaded once per process, quantized to int8, and served through
+a dynamic batcher: requests arriving within a few milliseconds of each other,
+and the 30 s chunks of a long recording, are decoded together in one
+``generate`` call.
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from audio_processing import decode_audio
+
+WHISPER_MODEL_DIR = os.getenv("WHISPER_MODEL_DIR", "./whisper-small-id")
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE", "indonesian")
+WHISPER_QUANTIZE = os.getenv("WHISPER_QUANTIZE", "1") != "0"
+WHISPER_NUM_THREADS = int(os.getenv("WHISPER_NUM_THREADS", 0)) or None
+
+SAMPLE_RATE = 16000
+CHUNK_SECONDS = 30
+MAX_AUDIO_SECONDS = int(os.getenv("WHISPER_MAX_AUDIO_SECONDS", 600))
+MAX_BATCH_SIZE = int(os.getenv("WHISPER_MAX_BATCH_SIZE", 8))
+MAX_BATCH_WAIT_MS = float(os.getenv("WHISPER_MAX_BATCH_WAIT_MS", 20))
+MAX_NEW_TOKENS = int(os.getenv("WHISPER_MAX_NEW_TOKENS", 224))
+
+
+class TranscriberUnavailable(RuntimeError):
+    pass
+
+
+def split_chunks(audio, chunk_seconds=CHUNK_SECONDS, sample_rate=SAMPLE_RATE):
+    chunk_size = chunk_seconds * sample_rate
+    return [audio[i:i + chunk_size] for i in range(0, max(audio.size, 1), chunk_size)]
+
+
+class WhisperEngine:
+    def __init__(self, model_dir=WHISPER_MODEL_DIR, language=WHISPER_LANGUAGE, quantize=WHISPER_QUANTIZE):
+        # torch and transformers are imported here so the rest of the service
+        # runs without them when transcription is not deployed.
+        import torch
+        from transformers import WhisperForConditionalGeneration, WhisperProcessor
+
+        if not os.path.isdir(model_dir):
+            raise TranscriberUnavailable(f"Whisper model not found at {model_dir}")
+
+        self.torch = torch
+        self.language = language
+        self.processor = WhisperProcessor.from_pretrained(model_dir)
+        model = WhisperForConditionalGeneration.from_pretrained(model_dir)
+        model.eval()
+        # Whisper reserves half its decoder positions for the prompt.
+        self.max_new_tokens = min(MAX_NEW_TOKENS, model.config.max_target_positions // 2)
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        self.model = model
+
+    def transcribe_batch(self, chunks):
+        features = self.processor.feature_extractor(
+            chunks, sampling_rate=SAMPLE_RATE, return_tensors="pt"
+        ).input_features
+        with self.torch.inference_mode():
+            token_ids = self.model.generate(
+                features,
+                language=self.language,
+                task="transcribe",
+                max_new_tokens=self.max_new_tokens,
+            )
+        return [
+            text.strip()
+            for text in self.processor.batch_decode(token_ids, skip_special_tokens=True)
+        ]
+
+
+class BatchingTranscriber:
+    def __init__(self, engine, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each worker process starts its own.
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                if WHISPER_NUM_THREADS:
+                    self.engine.torch.set_num_threads(WHISPER_NUM_THREADS)
+                threading.Thread(target=self._run, args=(self._queue,), daemon=True).start()
+            return self._queue
+
+    def _run(self, requests):
+        while True:
+            batch = [requests.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            chunks = [chunk for chunk, _ in batch]
+            try:
+                texts = self.engine.transcribe_batch(chunks)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+    def submit(self, chunk):
+        future = Future()
+        self._ensure_worker().put((chunk, future))
+        return future
+
+    def submit_audio(self, audio):
+        """Queue every 30 s chunk of ``audio``; returns one future per chunk."""
+        return [self.submit(chunk) for chunk in split_chunks(audio)]
+
+    def transcribe(self, audio):
+        return " ".join(future.result() for future in self.submit_audio(audio)).strip()
+
+
+_transcriber = None
+_transcriber_lock = threading.Lock()
+
+
+def get_transcriber():
+    """Load the model on first use; call from the parent before forking workers to share it."""
+    global _transcriber
+    with _transcriber_lock:
+        if _transcriber is None:
+            _transcriber = BatchingTranscriber(WhisperEngine())
+        return _transcriber
+
+
+def load_audio(fileobj, max_seconds=MAX_AUDIO_SECONDS):
+    return decode_audio(fileobj, target_rate=SAMPLE_RATE, max_seconds=max_seconds)
+
+
+def create_tiny_checkpoint(output_dir, seed=0):
+    """Write a randomly initialised, few-hundred-KB Whisper checkpoint.
+
+    It produces meaningless text but exercises the whole loading, quantizing
+    and batching path without downloading anything. The tokenizer is
+    byte-level with Whisper's special tokens.
+    """
+    import json
+
+    import torch
+    from transformers import (
+        GenerationConfig,
+        WhisperConfig,
+        WhisperFeatureExtractor,
+        WhisperForConditionalGeneration,
+        WhisperProcessor,
+        WhisperTokenizer,
+    )
+    from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+    from transformers.models.whisper.tokenization_whisper import LANGUAGES
+
+    os.makedirs(output_dir, exist_ok=True)
+    vocab = {char: i for i, char in enumerate(bytes_to_unicode().values())}
+    special = ["<|endoftext|>", "<|startoftranscript|>"]
+    special += [f"<|{code}|>" for code in LANGUAGES]
+    special += ["<|translate|>", "<|transcribe|>", "<|startoflm|>", "<|startofprev|>", "<|nospeech|>", "<|notimestamps|>"]
+    for token in special:
+        vocab[token] = len(vocab)
+
+    vocab_file = os.path.join(output_dir, "vocab.json")
+    merges_file = os.path.join(output_dir, "merges.txt")
+    with open(vocab_file, "w") as file:
+        json.dump(vocab, file)
+    with open(merges_file, "w") as file:
+        file.write("#version: 0.2\n")
+
+    tokenizer = WhisperTokenizer(
+        vocab_file,
+        merges_file,
+        unk_token="<|endoftext|>",
+        bos_token="<|endoftext|>",
+        eos_token="<|endoftext|>",
+        pad_token="<|endoftext|>",
+    )
+    tokenizer.add_special_tokens({"additional_special_tokens": special[1:]})
+    processor = WhisperProcessor(WhisperFeatureExtractor(), tokenizer)
+
+    eot = vocab["<|endoftext|>"]
+    config = WhisperConfig(
+        vocab_size=len(vocab),
+        num_mel_bins=80,
+        d_model=64,
+        encoder_layers=1,
+        decoder_layers=1,
+        encoder_attention_heads=2,
+        decoder_attention_heads=2,
+        encoder_ffn_dim=128,
+        decoder_ffn_dim=128,
+        max_source_positions=1500,
+        max_target_positions=64,
+        pad_token_id=eot,
+        bos_token_id=eot,
+        eos_token_id=eot,
+        decoder_start_token_id=vocab["<|startoftranscript|>"],
+    )
+    torch.manual_seed(seed)
+    model = WhisperForConditionalGeneration(config)
+    model.generation_config = GenerationConfig(
+        decoder_start_token_id=config.decoder_start_token_id,
+        pad_token_id=eot,
+        bos_token_id=eot,
+        eos_token_id=eot,
+        max_length=64,
+        is_multilingual=True,
+        lang_to_id={f"<|{code}|>": vocab[f"<|{code}|>"] for code in LANGUAGES},
+        task_to_id={"transcribe": vocab["<|transcribe|>"], "translate": vocab["<|translate|>"]},
+        no_timestamps_token_id=vocab["<|notimestamps|>"],
+        begin_suppress_tokens=[eot],
+    )
+    model.save_pretrained(output_dir)
+    processor.save_pretrained(output_dir)
+    return output_dir
+
+
+def benchmark(model_dir, seconds, concurrency):
+    engine = WhisperEngine(model_dir=model_dir)
+    transcriber = BatchingTranscriber(engine)
+    rng = np.random.default_rng(0)
+    audio = [
+        (0.1 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+        for _ in range(concurrency)
+    ]
+    transcriber.transcribe(audio[0][:SAMPLE_RATE])  # warm up
+    start = time.perf_counter()
+    futures = [transcriber.submit_audio(clip) for clip in audio]
+    for chunk_futures in futures:
+        for future in chunk_futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+    total_audio = seconds * concurrency
+    print(f"{total_audio:.0f}s of audio in {elapsed:.2f}s, real-time factor {elapsed / total_audio:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper transcription utilities")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    tiny = subparsers.add_parser("tiny-checkpoint", help="write a tiny random checkpoint")
+    tiny.add_argument("output_dir")
+    bench = subparsers.add_parser("bench", help="measure the real-time factor")
+    bench.add_argument("--model-dir", default=WHISPER_MODEL_DIR)
+    bench.add_argument("--seconds", type=float, default=60)
+    bench.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == "tiny-checkpoint":
+        print(f"Wrote {create_tiny_checkpoint(args.output_dir)}")
+    else:
+        benchmark(args.model_dir, args.seconds, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
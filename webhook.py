@@ -0,0 +1,371 @@
+"""Durable, pooled webhook delivery.
+
+``WebhookDispatcher.enqueue`` serializes the event once, appends it to a
+SQLite outbox and returns without touching the network. Worker threads
+claim due rows, sign them, POST
+them over a keep-alive connection pool and delete them on a 2xx response.
+Failures are retried with exponential backoff capped at
+``WEBHOOK_BACKOFF_MAX``, indefinitely by default. If ``WEBHOOK_MAX_ATTEMPTS``
+is set, rows that exhaust it are kept with status ``dead`` rather than
+dropped and can be sent again once the receiver is back:
+
+    python webhook.py status
+    python webhook.py requeue
+
+Claims are leased, so rows held by a crashed worker are picked up again.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+WEBHOOK_OUTBOX_PATH = os.getenv("WEBHOOK_OUTBOX_PATH", "./data/webhook_outbox.sqlite3")
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", 4))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", 10))
+# 0 keeps retrying at the backoff cap until the receiver accepts the event.
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 0))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", 1))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", 600))
+# Events for the same URL delivered in one request as
+# {"event": "batch", "data": [<payload>, ...]}; 1 disables batching.
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 1))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", 1))
+WEBHOOK_LEASE_SECONDS = WEBHOOK_TIMEOUT * 3
+
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def encode_payload(event, data):
+    return json.dumps({"event": event, "data": data}, default=_json_default).encode("utf-8")
+
+
+def sign_payload(secret, body):
+    return hmac.new(bytes(secret, "utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def backoff_delay(attempts, base=WEBHOOK_BACKOFF_BASE, maximum=WEBHOOK_BACKOFF_MAX):
+    # Full jitter keeps retries from many workers from arriving in lockstep.
+    # The exponent is clamped because retries no longer stop; 2 ** 1024
+    # would not fit in a float.
+    return random.uniform(0, min(maximum, base * 2 ** min(attempts, 32)))
+
+
+class WebhookOutbox:
+    def __init__(self, path=WEBHOOK_OUTBOX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    locked_until REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)"
+            )
+
+    def _connect(self):
+        # One connection per thread and per process; sqlite3 connections must
+        # not cross either boundary.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, url, event, body):
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT INTO outbox (url, event, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (url, event, body, now, now),
+        )
+        return cursor.lastrowid
+
+    def claim(self, limit, lease_seconds=WEBHOOK_LEASE_SECONDS):
+        """Lease up to ``limit`` due rows that share the URL of the oldest one."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            oldest = conn.execute(
+                "SELECT url FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "AND locked_until <= ? ORDER BY next_attempt_at, id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if oldest is None:
+                conn.execute("COMMIT")
+                return []
+            rows = conn.execute(
+                "SELECT id, url, event, body, attempts FROM outbox WHERE status = 'pending' "
+                "AND url = ? AND next_attempt_at <= ? AND locked_until <= ? "
+                "ORDER BY next_attempt_at, id LIMIT ?",
+                (oldest[0], now, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET locked_until = ? WHERE id = ?",
+                [(now + lease_seconds, row[0]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def delivered(self, ids):
+        self._connect().executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def failed(self, ids, attempts, error, max_attempts=WEBHOOK_MAX_ATTEMPTS):
+        status = "dead" if max_attempts and attempts >= max_attempts else "pending"
+        next_attempt_at = time.time() + backoff_delay(attempts)
+        self._connect().executemany(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, "
+            "locked_until = 0, last_error = ? WHERE id = ?",
+            [(status, attempts, next_attempt_at, str(error)[:500], i) for i in ids],
+        )
+        return status
+
+    def requeue_dead(self, url=None):
+        """Make ``dead`` rows due again with a fresh attempt count; returns how many."""
+        query = "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, locked_until = 0 WHERE status = 'dead'"
+        params = [time.time()]
+        if url is not None:
+            query += " AND url = ?"
+            params.append(url)
+        return self._connect().execute(query, params).rowcount
+
+    def counts(self):
+        return dict(
+            self._connect().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        )
+
+
+class WebhookDispatcher:
+    def __init__(
+        self,
+        outbox=None,
+        secret=None,
+        concurrency=WEBHOOK_CONCURRENCY,
+        timeout=WEBHOOK_TIMEOUT,
+        batch_size=WEBHOOK_BATCH_SIZE,
+        poll_interval=WEBHOOK_POLL_INTERVAL,
+    ):
+        self.outbox = outbox
+        self.secret = secret
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._wakeup = None
+        self._stopping = None
+        self._threads = []
+
+    def _ensure_started(self):
+        # Started lazily and again after fork: worker threads and pooled
+        # sockets belong to the process that created them.
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if self.outbox is None:
+                self.outbox = WebhookOutbox()
+            self._wakeup = threading.Event()
+            self._stopping = threading.Event()
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrency, max_retries=0)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self._threads = [
+                threading.Thread(target=self._run, name=f"webhook-{i}", daemon=True)
+                for i in range(self.concurrency)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def start(self):
+        self._ensure_started()
+
+    def stop(self, timeout=5):
+        if self._stopping is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self.session.close()
+        self._pid = None
+
+    def enqueue(self, event, data, url=None):
+        self._ensure_started()
+        url = url or os.getenv("WEBHOOK_URL", "http://localhost:8002/webhook")
+        event_id = self.outbox.add(url, event, encode_payload(event, data))
+        self._wakeup.set()
+        return event_id
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                rows = self.outbox.claim(self.batch_size)
+            except sqlite3.OperationalError as e:
+                print(f"Webhook outbox unavailable: {e}")
+                rows = []
+            if not rows:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._deliver(rows)
+
+    def _deliver(self, rows):
+        url = rows[0][1]
+        ids = [row[0] for row in rows]
+        if len(rows) == 1:
+            body = rows[0][3]
+        else:
+            body = b'{"event": "batch", "data": [' + b", ".join(row[3] for row in rows) + b"]}"
+
+        secret = self.secret or os.getenv("WEBHOOK_SECRET", "very-long-secret")
+        headers = {
+            "Content-Type": "application/json",
+            "Signature": sign_payload(secret, body),
+        }
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+            if 200 <= response.status_code < 300:
+                self.outbox.delivered(ids)
+                return
+            error = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            error = e
+
+        attempts = max(row[4] for row in rows) + 1
+        status = self.outbox.failed(ids, attempts, error)
+        print(f"Webhook delivery to {url} failed ({error}), attempt {attempts}, {len(ids)} event(s) now {status}")
+
+
+class LocalWebhookReceiver:
+    """In-process webhook endpoint for tests and load tests.
+
+    Verifies signatures, unpacks batches and records each event. ``fail_rate``
+    and ``latency`` simulate a flaky or slow receiver.
+    """
+
+    def __init__(self, secret=None, fail_rate=0.0, latency=0.0, host="127.0.0.1", port=0):
+        self.secret = secret
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.events = []
+        self.requests = 0
+        self.bad_signatures = 0
+        self.condition = threading.Condition()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status = receiver.handle(body, self.headers.get("Signature"))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/webhook"
+
+    def handle(self, body, signature):
+        time.sleep(self.latency)
+        with self.condition:
+            self.requests += 1
+        if random.random() < self.fail_rate:
+            return 503
+        secret = self.secret or os.getenv("WEBHOOK_SECRET", "very-long-secret")
+        if signature != sign_payload(secret, body):
+            with self.condition:
+                self.bad_signatures += 1
+            return 401
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400
+        payloads = payload["data"] if payload.get("event") == "batch" else [payload]
+        for item in payloads:
+            self.record(item)
+        return 200
+
+    def record(self, payload):
+        with self.condition:
+            self.events.append(payload)
+            self.condition.notify_all()
+
+    def wait_for_count(self, count, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while len(self.events) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return len(self.events)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook outbox maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="count outbox rows by status")
+    requeue = subparsers.add_parser("requeue", help="retry events marked dead")
+    requeue.add_argument("--url", help="only events for this webhook URL")
+    args = parser.parse_args()
+
+    outbox = WebhookOutbox()
+    if args.command == "status":
+        print(outbox.counts())
+    else:
+        print(f"Requeued {outbox.requeue_dead(args.url)} dead event(s)")
+
+
+if __name__ == "__main__":
+    main()